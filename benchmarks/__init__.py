@@ -0,0 +1,6 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Type
+
+if TYPE_CHECKING:
+    from typing import Union, Optional, Any, Tuple, Dict, List
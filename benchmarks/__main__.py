@@ -0,0 +1,336 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import TYPE_CHECKING
+
+from scripts.constants import VERSION
+
+if TYPE_CHECKING:
+    from typing import Union, Optional, Any, Tuple, Dict, List, Callable, Type
+
+
+DEFAULT_KINGDOMS = [1, 100, 10000]
+DEFAULT_DEMOGRAPHICS = [1, 10, 1000]
+DEFAULT_MAX_DEMOGRAPHICS = 1_000_000  # total across the world. stops 10k kingdoms * 1000 demographics eating all memory
+DEFAULT_THRESHOLD = 0.1
+
+
+def main():
+    """
+    The entry for the benchmarks. Either run them and record the results, or compare two sets of results.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the simulation, persistence and screen construction.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks and record the results")
+    run_parser.add_argument("--output", default="benchmarks/results.json", help="file to record results in")
+    run_parser.add_argument("--kingdoms", type=int, nargs="+", default=DEFAULT_KINGDOMS)
+    run_parser.add_argument("--demographics", type=int, nargs="+", default=DEFAULT_DEMOGRAPHICS)
+    run_parser.add_argument("--max-demographics", type=int, default=DEFAULT_MAX_DEMOGRAPHICS,
+                            help="skip world sizes with more demographics than this in total")
+    run_parser.add_argument("--repeats", type=int, default=5, help="samples taken of each case")
+    run_parser.add_argument("--cases", nargs="+", help="only run the named cases")
+    run_parser.add_argument("--no-screens", action="store_true", help="skip the cases that need a display")
+
+    compare_parser = commands.add_parser("compare", help="flag regressions between two result files")
+    compare_parser.add_argument("baseline", help="results to compare against")
+    compare_parser.add_argument("candidate", help="results to check for regressions")
+    compare_parser.add_argument("--baseline-version", help="version in the baseline file. Defaults to the latest.")
+    compare_parser.add_argument("--candidate-version", help="version in the candidate file. Defaults to the latest.")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                help="fractional slowdown or memory growth treated as a regression")
+
+    scaling_parser = commands.add_parser("scaling", help="time births and deaths sharded across 1 to N workers")
+    scaling_parser.add_argument("--kingdoms", type=int, default=10000)
+    scaling_parser.add_argument("--demographics", type=int, default=100)
+    scaling_parser.add_argument("--days", type=int, default=30, help="days stepped in each sample")
+    scaling_parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    scaling_parser.add_argument("--repeats", type=int, default=3, help="samples taken at each worker count")
+
+    memory_parser = commands.add_parser("memory", help="report bytes per record of each component representation")
+    memory_parser.add_argument("--records", type=int, default=100_000, help="records created of each kind")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run(args)
+    elif args.command == "scaling":
+        run_scaling(args)
+    elif args.command == "memory":
+        run_memory(args)
+    else:
+        regressions = compare(args)
+        sys.exit(1 if regressions else 0)
+
+
+############################ RUN ##############################
+
+def run(args: argparse.Namespace):
+    """
+    Run every case against every world size and record the results under the current version.
+    """
+    # screens need pygame, but there doesnt need to be a real window
+    if not args.no_screens:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+    from benchmarks import cases
+
+    results = {}
+    for kingdoms in args.kingdoms:
+        for demographics in args.demographics:
+            if kingdoms * demographics > args.max_demographics:
+                print(f"skipping {kingdoms} kingdoms * {demographics} demographics. Too many demographics.")
+                continue
+
+            for name, case in cases.get_cases(not args.no_screens).items():
+                if args.cases and name not in args.cases:
+                    continue
+
+                key = f"{name}[kingdoms={kingdoms},demographics={demographics}]"
+                cases.create_world(kingdoms, demographics)
+                results[key] = measure(case, cases.PREPARATIONS.get(name), args.repeats)
+                print(f"{key:<65} {results[key]['median_seconds']:10.6f}s {results[key]['peak_bytes']:>14,} bytes")
+
+    record_results(args.output, results)
+
+    # in case the larger worlds were sharded
+    from scripts import demography
+    demography.shutdown_workers()
+
+
+def run_scaling(args: argparse.Namespace):
+    """
+    Time stepping births and deaths with each number of workers from 1 up to the maximum, printing the speedup over a
+    single worker. A single worker steps everything in this process. Each call is also broken down into stepping the
+    kept columns and writing them back on to the Demographics, which is always serial, and gathering the columns,
+    which is serial too but only happens when populations change.
+    """
+    from benchmarks import cases
+    from scripts import demography, world
+    from scripts.components import Population
+    from scripts.constants import PARALLEL_DEMOGRAPHY_THRESHOLD
+
+    work = args.kingdoms * args.demographics * args.days
+    if work < PARALLEL_DEMOGRAPHY_THRESHOLD:
+        print(f"{work:,} demographic days is below the threshold of {PARALLEL_DEMOGRAPHY_THRESHOLD:,}, so everything "
+              f"will be stepped in this process.")
+
+    cases.create_world(args.kingdoms, args.demographics)
+    populations = [(kingdom, population) for kingdom, (population, ) in world.get_components([Population])]
+    seed = world.get_seed()
+
+    baseline = 0.0
+    for workers in range(1, args.max_workers + 1):
+        demography.set_worker_count(workers)
+
+        # the first sample starts the workers and gathers the columns, so isnt counted
+        cases.advance_births_and_deaths(args.days)
+
+        timings = []
+        for repeat in range(args.repeats):
+            start = time.perf_counter()
+            cases.advance_births_and_deaths(args.days)
+            timings.append(time.perf_counter() - start)
+
+        # the same work again, a phase at a time, on the columns kept by the samples above
+        columns = demography.get_columns(populations)
+        is_sharded = demography.can_shard(len(columns.sources), args.days)
+        step_timings = []
+        write_back_timings = []
+        for repeat in range(args.repeats):
+            first_day = world.get_days_passed()
+            start = time.perf_counter()
+            if is_sharded:
+                demography.advance_sharded(columns, seed, first_day, args.days)
+            else:
+                for day in range(first_day, first_day + args.days):
+                    demography.advance_columns(columns, seed, day)
+            step_timings.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            demography.write_back_columns(columns)
+            write_back_timings.append(time.perf_counter() - start)
+            world.pass_days(args.days)
+
+        demography.discard_columns()
+        start = time.perf_counter()
+        demography.get_columns(populations)
+        gather = time.perf_counter() - start
+
+        median = statistics.median(timings)
+        baseline = baseline or median
+        speedup = baseline / median
+        print(f"{workers:>3} workers {median:10.6f}s speedup {speedup:6.2f}x efficiency {speedup / workers:7.1%} | "
+              f"step {statistics.median(step_timings):10.6f}s write back {statistics.median(write_back_timings):10.6f}s "
+              f"gather, when populations change {gather:10.6f}s")
+
+    demography.shutdown_workers()
+
+
+def measure(case: Callable[[], Any], preparation: Optional[Callable[[], Any]], repeats: int) -> Dict[str, Any]:
+    """
+    Time a case over a number of samples, then run it once more to find its peak memory use.
+    """
+    timings = []
+    for repeat in range(repeats):
+        if preparation:
+            preparation()
+        start = time.perf_counter()
+        case()
+        timings.append(time.perf_counter() - start)
+
+    # tracemalloc slows everything down so measure memory separately
+    if preparation:
+        preparation()
+    tracemalloc.start()
+    case()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "median_seconds": statistics.median(timings),
+        "min_seconds": min(timings),
+        "max_seconds": max(timings),
+        "repeats": repeats,
+        "peak_bytes": peak
+    }
+
+
+def record_results(filename: str, results: Dict[str, Dict[str, Any]]):
+    """
+    Write the results to file under the current version, keeping results for other versions. Versions are kept in the
+    order they were last recorded, see select_version.
+    """
+    all_results = load_results(filename) if os.path.exists(filename) else {}
+
+    # re-recording a version moves it to the end, so the last version is always the latest recorded
+    all_results.pop(VERSION, None)
+    all_results[VERSION] = results
+
+    with open(filename, "w") as file:
+        json.dump(all_results, file, indent=4)
+
+
+def run_memory(args: argparse.Namespace):
+    """
+    Create many records of each kind held in components, in each way they can be held, and print the bytes each takes.
+    "dict" is a plain object with a __dict__, as they were before being slotted. Values, such as names, are counted
+    too, so the figures are what a world full of them would cost.
+    """
+    import attr
+    from scripts.components import Demographic, Details, Hourglass, LazyRecordArray, Land, StaffMember
+
+    records = args.records
+
+    # records held in list components. Created from their class, so the same values can go in each representation.
+    record_types: Dict[Type, Callable[[Type, int], Any]] = {
+        Demographic: lambda cls, index: cls(f"Human {index}", "Earth", 100 + index, 0.05, 1, 4, 50.0 + index,
+                                            index / 3, index / 7),
+        Land: lambda cls, index: cls(f"Land {index}", "plains", "large"),
+        StaffMember: lambda cls, index: cls(f"Staff {index}", "steward", index),
+    }
+    for record_type, create in record_types.items():
+        unslotted_type = attr.make_class(record_type.__name__, [field.name for field in attr.fields(record_type)])
+        array_type = type(record_type.__name__ + "Array", (LazyRecordArray, ),
+                          {"__slots__": (), "record_type": record_type})
+        representations = {
+            "dict": lambda: [create(unslotted_type, index) for index in range(records)],
+            "slotted": lambda: [create(record_type, index) for index in range(records)],
+            "array": lambda: array_type(create(record_type, index) for index in range(records)),
+        }
+        _print_bytes_per_record(record_type.__name__, representations, records)
+
+    # components holding single values
+    component_types: Dict[Type, Callable[[Type, int], Any]] = {
+        Details: lambda cls, index: cls(f"Kingdom {index}"),
+        Hourglass: lambda cls, index: cls(index),
+    }
+    for component_type, create in component_types.items():
+        unslotted_type = type(component_type.__name__, (), {"__init__": component_type.__init__})
+        representations = {
+            "dict": lambda: [create(unslotted_type, index) for index in range(records)],
+            "slotted": lambda: [create(component_type, index) for index in range(records)],
+        }
+        _print_bytes_per_record(component_type.__name__, representations, records)
+
+
+def _print_bytes_per_record(name: str, representations: Dict[str, Callable[[], Any]], records: int):
+    """
+    Print the bytes per record taken by what each representation creates.
+    """
+    for representation, create_all in representations.items():
+        tracemalloc.start()
+        created = create_all()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del created
+
+        print(f"{name:<15} {representation:<10} {current / records:10.1f} bytes per record")
+
+
+############################ COMPARE ##############################
+
+def compare(args: argparse.Namespace) -> List[str]:
+    """
+    Print how each case changed between the two result files. Returns the cases that regressed.
+    """
+    baseline = select_version(load_results(args.baseline), args.baseline_version)
+    candidate = select_version(load_results(args.candidate), args.candidate_version)
+
+    regressions = []
+    for key in sorted(baseline.keys() & candidate.keys()):
+        old = baseline[key]
+        new = candidate[key]
+        time_change = _relative_change(old["median_seconds"], new["median_seconds"])
+        memory_change = _relative_change(old["peak_bytes"], new["peak_bytes"])
+
+        flag = ""
+        if time_change > args.threshold or memory_change > args.threshold:
+            flag = "REGRESSION"
+            regressions.append(key)
+
+        print(f"{key:<65} time {time_change:+8.1%} memory {memory_change:+8.1%} {flag}")
+
+    for key in sorted(baseline.keys() ^ candidate.keys()):
+        print(f"{key:<65} only in {'baseline' if key in baseline else 'candidate'}")
+
+    print(f"{len(regressions)} regressions found.")
+
+    return regressions
+
+
+def load_results(filename: str) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """
+    Read a results file, keyed by version.
+    """
+    with open(filename, "r") as file:
+        return json.load(file)
+
+
+def select_version(all_results: Dict[str, Dict[str, Dict[str, Any]]], version: Optional[str]):
+    """
+    Get the results for a version. If no version is given get the most recently recorded.
+    """
+    if version is None:
+        version = list(all_results)[-1]
+
+    return all_results[version]
+
+
+def _relative_change(old: float, new: float) -> float:
+    """
+    Get the change from old to new as a fraction of old.
+    """
+    if old == 0:
+        return 0.0 if new == 0 else float("inf")
+    return (new - old) / old
+
+
+if __name__ == "__main__":  # prevents being run from other modules
+    main()
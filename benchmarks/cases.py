@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import os
+from typing import TYPE_CHECKING
+
+from snecs import World
+
+from scripts import demography, headless, persistence, processors, state, world
+from scripts.components import Population
+from scripts.constants import BASE_WINDOW_HEIGHT, BASE_WINDOW_WIDTH, SAVE_PATH
+
+if TYPE_CHECKING:
+    from typing import Union, Optional, Any, Tuple, Dict, List, Callable, Type
+
+
+# how many lookups make up a single sample of the cheap cases
+LOOKUPS_PER_SAMPLE = 1000
+
+# world seed, so every run simulates the same thing
+SEED = 1
+
+
+################################ CREATE - INIT OBJECT - RETURN NEW OBJECT ###############################
+
+def create_world(kingdoms: int, demographics: int):
+    """
+    Replace the current world with a new one of the given size.
+    """
+    persistence.wait_for_saves()
+    world.move_world(World())
+    world.set_days_passed(1)
+    world.set_seed(SEED)
+    headless.create_world(kingdoms, demographics)
+    os.makedirs(SAVE_PATH, exist_ok=True)
+
+
+############################# GET - RETURN AN EXISTING SOMETHING ###########################
+
+def get_cases(include_screens: bool) -> Dict[str, Callable[[], Any]]:
+    """
+    Get each benchmark case by name. Each case runs a single sample when called.
+    """
+    cases = {
+        "process_end_of_day": processors.process_end_of_day,
+        "save_game": save_game,
+        "load_game": load_game,
+        "get_player_kingdom": get_player_kingdom,
+        "serialise_populations": serialise_populations,
+        "deserialise_populations": deserialise_populations,
+    }
+
+    if include_screens:
+        cases["council_screen"] = create_council_screen
+        cases["antechamber_screen"] = create_antechamber_screen
+
+    return cases
+
+
+################################ CASES ###############################
+
+def save_game():
+    """
+    Save the current world to a file, including the time spent writing in the background.
+    """
+    state.save_game()
+    persistence.wait_for_saves()
+
+
+def load_game():
+    """
+    Load the current world back from a file. Saves first, outside of what is being measured.
+    """
+    state.load_game(_last_save["filename"])
+
+
+def prepare_load_game():
+    """
+    Save the current world so load_game has something to load.
+    """
+    _last_save["filename"] = state.save_game()
+
+
+def advance_births_and_deaths(days: int):
+    """
+    Step births and deaths for every kingdom over a number of days, without the saving and other end of day work.
+    """
+    populations = [(kingdom, population) for kingdom, (population, ) in world.get_components([Population])]
+    demography.process_births_and_deaths(populations, world.get_seed(), world.get_days_passed(), days)
+    world.pass_days(days)
+
+
+def serialise_populations():
+    """
+    Serialise the elements of every kingdom's population.
+    """
+    for kingdom, (population, ) in world.get_components([Population]):
+        population.serialize_elements()
+
+
+def deserialise_populations():
+    """
+    Deserialise the elements of every kingdom's population, as serialised by prepare_deserialise_populations.
+    """
+    for serialised in _serialised_populations:
+        Population.deserialize_elements(serialised)
+
+
+def prepare_deserialise_populations():
+    """
+    Serialise the elements of every kingdom's population, so deserialise_populations has something to deserialise.
+    """
+    _serialised_populations[:] = [population.serialize_elements()
+                                  for kingdom, (population, ) in world.get_components([Population])]
+
+
+def get_player_kingdom():
+    """
+    Look up the player's kingdom many times over.
+    """
+    for lookup in range(LOOKUPS_PER_SAMPLE):
+        world.get_player_kingdom()
+
+
+def create_council_screen():
+    """
+    Construct and then destroy the council screen.
+    """
+    from scripts.ui_elements.council import CouncilScreen
+    _create_screen(CouncilScreen)
+
+
+def create_antechamber_screen():
+    """
+    Construct and then destroy the antechamber screen.
+    """
+    from scripts.ui_elements.antechamber import AntechamberScreen
+    _create_screen(AntechamberScreen)
+
+
+def _create_screen(screen_type: Type):
+    """
+    Construct and then destroy a screen.
+    """
+    from pygame.rect import Rect
+    from scripts import ui
+    from scripts.stores.ui_data import ui_data
+
+    if ui_data.gui is None:
+        ui.initialise()
+
+    screen = screen_type(ui_data.gui, Rect((0, 0), (BASE_WINDOW_WIDTH, BASE_WINDOW_HEIGHT)))
+    screen.kill()
+
+
+# holds the filename written by prepare_load_game
+_last_save: Dict[str, str] = {"filename": ""}
+
+# holds the populations serialised by prepare_deserialise_populations
+_serialised_populations: List[Any] = []
+
+# cases that need something done before they are measured
+PREPARATIONS: Dict[str, Callable[[], Any]] = {
+    "load_game": prepare_load_game,
+    "deserialise_populations": prepare_deserialise_populations,
+}
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import pickle
+import struct
+from typing import TYPE_CHECKING, Mapping
+
+from scripts.constants import CATALOG_CACHE_PATH, CATALOG_CACHE_VERSION, DATA_PATH
+
+if TYPE_CHECKING:
+    from typing import Union, Optional, Any, Tuple, Dict, List, Iterator
+
+
+logger = logging.getLogger(__name__)
+
+# the cache starts with the length of its header, then the header, then each entry pickled in turn
+_HEADER_LENGTH = struct.Struct("<Q")
+
+
+class Catalog(Mapping):
+    """
+    Read-only access to the entries of a compiled data file, keyed by name. Entries are only unpickled from the cache
+    when first accessed, and are then kept.
+    """
+    def __init__(self, name: str, index: Dict[str, Tuple[int, int]], data: Union[bytes, mmap.mmap], start: int = 0,
+            entries: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.name = name
+        self._index = index  # entry name: (offset, length) from start
+        self._data = data
+        self._start = start
+        self._entries: Dict[str, Dict[str, Any]] = entries if entries is not None else {}
+
+    def __getitem__(self, key: str) -> Dict[str, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            offset, length = self._index[key]
+            offset += self._start
+            entry = self._entries[key] = pickle.loads(self._data[offset:offset + length])
+        return entry
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._index
+
+
+################################ CREATE - INIT OBJECT - RETURN NEW OBJECT ###############################
+
+def load_catalog(name: str) -> Catalog:
+    """
+    Load the named data file, e.g. "races" for data/races.json. Uses the compiled cache if it is up to date, otherwise
+    compiles the data file and caches the result.
+    """
+    source_path = DATA_PATH + name + ".json"
+    cache_path = CATALOG_CACHE_PATH + name + ".cache"
+    mtime_ns = os.stat(source_path).st_mtime_ns
+
+    catalog = _read_cache(name, cache_path, source_path, mtime_ns)
+    if catalog is None:
+        catalog = _compile(name, cache_path, source_path, mtime_ns)
+
+    return catalog
+
+
+################################ ACTIONS - CHANGE STATE - RETURN NOTHING ###############################
+
+def _read_cache(name: str, cache_path: str, source_path: str, mtime_ns: int) -> Optional[Catalog]:
+    """
+    Map the cache into memory and read its header. Returns None if there is no cache, or it is out of date. A cache
+    whose recorded mtime differs from the source's is still used if the source's hash matches, e.g. after a fresh
+    checkout.
+    """
+    try:
+        with open(cache_path, "rb") as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        return None
+    except OSError:
+        # e.g. no permission to read it. Compiling again still works, and at worst cant write the cache either.
+        logger.warning("Couldn't read catalog cache %s. Recompiling it.", cache_path, exc_info=True)
+        return None
+
+    try:
+        header_length, = _HEADER_LENGTH.unpack_from(data, 0)
+        header = pickle.loads(data[_HEADER_LENGTH.size:_HEADER_LENGTH.size + header_length])
+    except Exception:
+        logger.warning("Catalog cache %s is corrupt. Recompiling it.", cache_path)
+        data.close()
+        return None
+
+    if header.get("version") != CATALOG_CACHE_VERSION:
+        data.close()
+        return None
+
+    # offsets in the index are relative to the end of the header
+    start = _HEADER_LENGTH.size + header_length
+
+    if header["mtime_ns"] != mtime_ns:
+        with open(source_path, "rb") as file:
+            if hashlib.sha256(file.read()).hexdigest() != header["source_hash"]:
+                data.close()
+                return None
+
+        # the content is unchanged, so only the recorded mtime is out of date
+        header["mtime_ns"] = mtime_ns
+        body = data[start:]
+        data.close()
+        try:
+            _write_cache(cache_path, header, body)
+        except OSError:
+            # e.g. the cache is read only, or mapped by another process. What was read is still good.
+            logger.exception("Failed to write catalog cache %s.", cache_path)
+            return Catalog(name, header["index"], body)
+        return _read_cache(name, cache_path, source_path, mtime_ns)
+
+    return Catalog(name, header["index"], data, start)
+
+
+def _compile(name: str, cache_path: str, source_path: str, mtime_ns: int) -> Catalog:
+    """
+    Parse the data file, pickle each entry separately and write them all to the cache.
+    """
+    with open(source_path, "rb") as file:
+        source = file.read()
+
+    entries: Dict[str, Dict[str, Any]] = json.loads(source)
+
+    index: Dict[str, Tuple[int, int]] = {}
+    blobs = []
+    offset = 0
+    for key, entry in entries.items():
+        blob = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+        index[key] = (offset, len(blob))
+        blobs.append(blob)
+        offset += len(blob)
+    body = b"".join(blobs)
+
+    header = {
+        "version": CATALOG_CACHE_VERSION,
+        "mtime_ns": mtime_ns,
+        "source_hash": hashlib.sha256(source).hexdigest(),
+        "index": index
+    }
+
+    try:
+        _write_cache(cache_path, header, body)
+    except OSError:
+        logger.exception("Failed to write catalog cache %s.", cache_path)
+
+    logger.info("Compiled %s entries from %s.", len(index), source_path)
+
+    # everything is already in memory so no need to read the cache back
+    return Catalog(name, index, body, entries=entries)
+
+
+def _write_cache(cache_path: str, header: Dict[str, Any], body: bytes):
+    """
+    Write a cache file. Written to a temporary file first and then swapped in, so a reader never sees half a cache.
+    """
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+
+    header_blob = pickle.dumps(header, protocol=pickle.HIGHEST_PROTOCOL)
+    temp_path = cache_path + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(_HEADER_LENGTH.pack(len(header_blob)))
+        file.write(header_blob)
+        file.write(body)
+    os.replace(temp_path, cache_path)
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+from itertools import repeat
+from operator import attrgetter
+from typing import TYPE_CHECKING, Type
+
+import attr
+
+if TYPE_CHECKING:
+    from typing import Union, Optional, Any, Tuple, Dict, List, Callable, Iterable
+
+
+class Codec:
+    """
+    Encode and decode lists of an attrs class as columns: each field's name once, with the values of that field, in
+    order, as a list. The encoding and the filling of missing columns are generated for the class, see create_codec.
+    """
+    __slots__ = ("record_type", "field_names", "encode", "_fill_columns", "_build")
+
+    def __init__(self, record_type: Type, field_names: Tuple[str, ...],
+            encode: Callable[[Iterable[Any]], Dict[str, List[Any]]],
+            fill_columns: Callable[[Dict[str, List[Any]]], Tuple[Iterable[Any], ...]],
+            build: Callable[..., List[Any]]):
+        self.record_type: Type = record_type
+        self.field_names: Tuple[str, ...] = field_names
+
+        # records to a column per field, keyed by field name
+        self.encode: Callable[[Iterable[Any]], Dict[str, List[Any]]] = encode
+
+        # columns keyed by field name to a column per field, in field order, with defaults for those missing
+        self._fill_columns: Callable[[Dict[str, List[Any]]], Tuple[Iterable[Any], ...]] = fill_columns
+
+        # a column per field, in field order, to records
+        self._build: Callable[..., List[Any]] = build
+
+    def decode(self, serialised: Dict[str, Any]) -> List[Any]:
+        """
+        Build records from their columns, in bulk.
+        """
+        return self._build(*self.get_columns(serialised))
+
+    def get_columns(self, serialised: Dict[str, Any]) -> Tuple[Iterable[Any], ...]:
+        """
+        Get a column per field, in field order, from encoded records. Missing columns are filled with the field's
+        default. Also accepts the older layout of one dict per record, keyed by the record's name.
+        """
+        if not serialised:
+            return tuple([] for name in self.field_names)
+
+        # older saves hold each record as a dict of its values
+        if isinstance(next(iter(serialised.values())), dict):
+            serialised = self.encode([self.record_type(**values) for values in serialised.values()])
+
+        return self._fill_columns(serialised)
+
+
+# codecs by the class they encode, see register_codec
+_codecs: Dict[Type, Codec] = {}
+
+
+################################ CREATE - INIT OBJECT - RETURN NEW OBJECT ###############################
+
+def register_codec(record_type: Type) -> Type:
+    """
+    Create the codec for an attrs class and register it. Use as a decorator, above attr.s.
+    """
+    _codecs[record_type] = create_codec(record_type)
+    return record_type
+
+
+def create_codec(record_type: Type) -> Codec:
+    """
+    Generate the functions encoding and decoding an attrs class, specialised to its fields, so nothing about the
+    class is looked up when they are called.
+    """
+    fields = attr.fields(record_type)
+    field_names = tuple(field.name for field in fields)
+    namespace: Dict[str, Any] = {"repeat": repeat}
+
+    # encode by pulling each field out of every record in turn
+    lines = ["def encode(records):", "    records = list(records)", "    return {"]
+    for index, field in enumerate(fields):
+        namespace[f"get_{index}"] = attrgetter(field.name)
+        lines.append(f"        {field.name!r}: list(map(get_{index}, records)),")
+    lines.append("    }")
+
+    # fill columns, using defaults for those missing, such as fields added since a save was written
+    lines += ["def fill_columns(columns):", "    count = len(next(iter(columns.values()), ()))", "    return ("]
+    for index, field in enumerate(fields):
+        if field.default is attr.NOTHING:
+            lines.append(f"        columns[{field.name!r}],")
+        elif isinstance(field.default, attr.Factory):  # type: ignore
+            namespace[f"factory_{index}"] = field.default.factory
+            lines.append(f"        columns.get({field.name!r}) or [factory_{index}() for _ in range(count)],")
+        else:
+            namespace[f"default_{index}"] = field.default
+            lines.append(f"        columns.get({field.name!r}) or repeat(default_{index}, count),")
+    lines.append("    )")
+
+    lines += _get_build_lines(record_type, fields, namespace)
+
+    exec(compile("\n".join(lines), f"<codec for {record_type.__name__}>", "exec"), namespace)
+
+    return Codec(record_type, field_names, namespace["encode"], namespace["fill_columns"], namespace["build"])
+
+
+def _get_build_lines(record_type: Type, fields: Tuple[attr.Attribute, ...], namespace: Dict[str, Any]) -> List[str]:
+    """
+    Get the source of a function building records from a column per field. Where nothing runs on init, such as
+    validators, the records are created empty and their fields set directly, skipping the call to __init__.
+    """
+    namespace["record_type"] = record_type
+    columns = ", ".join(f"column_{index}" for index in range(len(fields)))
+
+    is_init_needed = hasattr(record_type, "__attrs_post_init__") or any(
+        field.validator is not None or field.converter is not None or not field.init for field in fields)
+    if is_init_needed or not fields:
+        return [f"def build({columns}):", f"    return list(map(record_type, {columns}))"]
+
+    # frozen attrs classes replace __setattr__, so go around it
+    is_frozen = record_type.__setattr__ is not object.__setattr__
+    if is_frozen:
+        namespace["set_attribute"] = object.__setattr__
+
+    lines = [f"def build({columns}):",
+             "    new = object.__new__",
+             "    records = []",
+             "    append = records.append",
+             f"    for {', '.join(f'value_{index}' for index in range(len(fields)))} in zip({columns}):",
+             "        record = new(record_type)"]
+    for index, field in enumerate(fields):
+        if is_frozen:
+            lines.append(f"        set_attribute(record, {field.name!r}, value_{index})")
+        else:
+            lines.append(f"        record.{field.name} = value_{index}")
+    lines += ["        append(record)", "    return records"]
+
+    return lines
+
+
+############################# GET - RETURN AN EXISTING SOMETHING ###########################
+
+def get_codec(record_type: Type) -> Codec:
+    """
+    Get the codec for an attrs class, creating it if the class wasnt registered.
+    """
+    codec = _codecs.get(record_type)
+    if codec is None:
+        codec = _codecs[record_type] = create_codec(record_type)
+    return codec
@@ -1,17 +1,23 @@
 from __future__ import annotations
 
+import json
 import logging
 from abc import ABC
-from typing import TYPE_CHECKING, Type, List
+from array import array
+from typing import TYPE_CHECKING, Type, TypeVar, List, MutableSequence
 
 import attr
-from snecs import RegisteredComponent
+from snecs import Component, register_component
 
 from scripts import utility
-from scripts.constants import DAYS_IN_YEAR, MINUTES_IN_DAY
+from scripts.codec import get_codec, register_codec
+from scripts.constants import DAYS_IN_YEAR, MINUTES_IN_DAY, USE_ARRAY_BACKED_COMPONENTS
 
 if TYPE_CHECKING:
-    from typing import Union, Optional, Any, Tuple, Dict
+    from typing import Union, Optional, Any, Tuple, Dict, Iterable, Iterator
+
+
+_T = TypeVar("_T")
 
 
 ################## CLASSES USED IN COMPONENTS ##############################
@@ -36,7 +42,8 @@ if TYPE_CHECKING:
 #             _dict[member] = getattr(self, member)
 #
 #         return _dict
-@attr.s
+@register_codec
+@attr.s(slots=True)
 class Demographic:
     """
     Details about a section of the population.
@@ -60,7 +67,8 @@ class Demographic:
         return (self.birth_rate * self.amount) * (max(self.max_brood - self.min_brood, 1))
 
 
-@attr.s
+@register_codec
+@attr.s(slots=True, frozen=True)
 class Land:
     """
     Details about a section of the world.
@@ -70,34 +78,333 @@ class Land:
     size: str = attr.ib()
 
 
-@attr.s
+@register_codec
+@attr.s(slots=True, frozen=True)
 class StaffMember:
     name: str = attr.ib()
     role: str = attr.ib()
     skill: int = attr.ib()
 
 
-################ COMPONENTS ##########################
+class EmbeddedPayload:
+    """
+    Serialised data to be stored as a single string within a save, rather than as nested structures. Reading a
+    string back is far cheaper than reading the structures it holds, so they can be left until needed.
+    """
+    __slots__ = ("data", )
 
-class Population(List[Demographic], RegisteredComponent):
-    def serialize(self):
-        _dict = {}
-        for demo in self:
-            _dict[demo.name] = attr.asdict(demo)
+    def __init__(self, data: Any):
+        self.data = data
 
-        return _dict
+
+class LazyList(List[_T]):
+    """
+    A list that can be created from its serialised form without deserialising its contents. The contents are only
+    deserialised when the list is first used, so loading a game doesn't pay for building every element up front.
+    Serialises to an EmbeddedPayload, which is saved as a string and so is read back as one.
+    Subclasses must set record_type, an attrs class, whose codec encodes the elements. See codec.Codec.
+    """
+    __slots__ = ("_serialised", )
+    record_type: Type[_T]
+
+    def __init__(self, *args: Any):
+        super().__init__(*args)
+        self._serialised: Optional[Any] = None
+
+    def serialize(self):
+        # if never used, what we were loaded from is still accurate
+        if self._serialised is not None:
+            return self._serialised
+        return EmbeddedPayload(self.serialize_elements())
 
     @classmethod
     def deserialize(cls, serialized):
-        demo_list = []
+        lazy_list = cls()
+        lazy_list._serialised = serialized
+        return lazy_list
 
-        for key, demo in serialized.items():
-            demo_list.append(Demographic(**demo))
+    def serialize_elements(self) -> Any:
+        """
+        Serialise every element of the list, as columns.
+        """
+        return get_codec(self.record_type).encode(self)
+
+    @classmethod
+    def deserialize_elements(cls, serialized: Any) -> List[_T]:
+        """
+        Deserialise every element of the list from its columns.
+        """
+        return get_codec(cls.record_type).decode(serialized)
 
-        return Population(demo_list)
+    def _deserialise_if_needed(self):
+        """
+        Build the contents of the list from its serialised form, if that hasnt already been done.
+        """
+        serialised = self._serialised
+        if serialised is not None:
+            self._serialised = None
+
+            # unpack the payload, either as read from a save or as created by serialize
+            if isinstance(serialised, str):
+                serialised = json.loads(serialised)
+            elif isinstance(serialised, EmbeddedPayload):
+                serialised = serialised.data
 
+            list.extend(self, self.deserialize_elements(serialised))
+
+
+def _deserialise_before(method_name: str):
+    """
+    Wrap a list method so the LazyList's contents are deserialised before it is called.
+    """
+    list_method = getattr(list, method_name)
+
+    def wrapped_method(self, *args, **kwargs):
+        if self._serialised is not None:
+            self._deserialise_if_needed()
+        return list_method(self, *args, **kwargs)
+
+    wrapped_method.__name__ = method_name
+    wrapped_method.__doc__ = list_method.__doc__
+    return wrapped_method
+
+
+def _deserialise_both_before(method_name: str):
+    """
+    Wrap a list method taking another list so both the LazyList's contents and, if it is a LazyList, the other's are
+    deserialised before it is called. List methods read the other's contents directly, rather than iterating it.
+    """
+    list_method = getattr(list, method_name)
+
+    def wrapped_method(self, other, *args, **kwargs):
+        if self._serialised is not None:
+            self._deserialise_if_needed()
+        if isinstance(other, LazyList) and other._serialised is not None:
+            other._deserialise_if_needed()
+        return list_method(self, other, *args, **kwargs)
+
+    wrapped_method.__name__ = method_name
+    wrapped_method.__doc__ = list_method.__doc__
+    return wrapped_method
+
+
+for _method_name in ("__iter__", "__len__", "__getitem__", "__setitem__", "__delitem__", "__contains__",
+                     "__reversed__", "__mul__", "__imul__", "__repr__", "append", "insert", "remove", "pop", "index",
+                     "count", "sort", "reverse", "clear", "copy"):
+    setattr(LazyList, _method_name, _deserialise_before(_method_name))
+
+for _method_name in ("__eq__", "__ne__", "__lt__", "__le__", "__gt__", "__ge__", "__add__", "__iadd__", "extend"):
+    setattr(LazyList, _method_name, _deserialise_both_before(_method_name))
+
+
+# array typecodes for the record fields that can be held unboxed. Anything else is held in a list.
+_ARRAY_TYPECODES = {"int": "q", "float": "d"}
+
+
+class LazyRecordArray(MutableSequence[_T]):
+    """
+    A sequence of records held as columns, one per field of record_type, rather than as an object each. Int and float
+    fields are held in arrays, so take 8 bytes a record rather than a boxed object and a slot. Indexing and iterating
+    give a view of a row, which reads and writes the columns and otherwise acts as a record_type.
+    Mirrors the LazyList API, including lazy deserialisation, but is a MutableSequence rather than a list. It isnt an
+    instance of list, and lacks sort, copy, +, * and ordering comparisons.
+    Subclasses must set record_type, an attrs class. Serialises to the same columns as a LazyList, straight from its
+    own.
+    """
+    __slots__ = ("_serialised", "_columns")
+    record_type: Type[_T]
+
+    def __init__(self, records: Iterable[_T] = ()):
+        self._serialised: Optional[Any] = None
+        self._columns: List[Union[array, List[Any]]] = _create_columns(self.record_type)
+        self.extend(records)
+
+    def __len__(self) -> int:
+        if self._serialised is not None:
+            self._deserialise_if_needed()
+        return len(self._columns[0])
+
+    def __getitem__(self, index: int) -> _T:
+        if self._serialised is not None:
+            self._deserialise_if_needed()
+        if isinstance(index, slice):
+            return [self[row] for row in range(*index.indices(len(self)))]  # type: ignore
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self._columns[0]):
+            raise IndexError("record index out of range")
+        return _get_row_type(self.record_type)(self._columns, index)
+
+    def __setitem__(self, index: int, record: _T):
+        if self._serialised is not None:
+            self._deserialise_if_needed()
+        for column, field in zip(self._columns, attr.fields(self.record_type)):
+            column[index] = getattr(record, field.name)
+
+    def __delitem__(self, index: int):
+        if self._serialised is not None:
+            self._deserialise_if_needed()
+        for column in self._columns:
+            del column[index]
+
+    def __iter__(self) -> Iterator[_T]:
+        row_type = _get_row_type(self.record_type)
+        columns = self._columns
+        for index in range(len(self)):
+            yield row_type(columns, index)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({[row for row in self]!r})"
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (LazyRecordArray, list)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def insert(self, index: int, record: _T):
+        if self._serialised is not None:
+            self._deserialise_if_needed()
+        for column, field in zip(self._columns, attr.fields(self.record_type)):
+            column.insert(index, getattr(record, field.name))
+
+    def append(self, record: _T):
+        if self._serialised is not None:
+            self._deserialise_if_needed()
+        for column, field in zip(self._columns, attr.fields(self.record_type)):
+            column.append(getattr(record, field.name))
+
+    # serialised just as a LazyList is
+    serialize = LazyList.__dict__["serialize"]
+    deserialize = LazyList.__dict__["deserialize"]
+    deserialize_elements = LazyList.__dict__["deserialize_elements"]
+
+    def serialize_elements(self) -> Any:
+        """
+        Serialise every record, copying out the columns.
+        """
+        if self._serialised is not None:
+            self._deserialise_if_needed()
+        field_names = get_codec(self.record_type).field_names
+        return {name: column.tolist() if isinstance(column, array) else list(column)
+                for name, column in zip(field_names, self._columns)}
+
+    def _deserialise_if_needed(self):
+        """
+        Build the columns from the serialised form, if that hasnt already been done.
+        """
+        serialised = self._serialised
+        if serialised is not None:
+            self._serialised = None
+
+            # unpack the payload, either as read from a save or as created by serialize
+            if isinstance(serialised, str):
+                serialised = json.loads(serialised)
+            elif isinstance(serialised, EmbeddedPayload):
+                serialised = serialised.data
+
+            for column, values in zip(self._columns, get_codec(self.record_type).get_columns(serialised)):
+                column.extend(values)
+
+
+def _create_columns(record_type: Type) -> List[Union[array, List[Any]]]:
+    """
+    Create an empty column for each field of an attrs class.
+    """
+    columns: List[Union[array, List[Any]]] = []
+    for field in attr.fields(record_type):
+        type_name = field.type if isinstance(field.type, str) else getattr(field.type, "__name__", None)
+        typecode = _ARRAY_TYPECODES.get(type_name)
+        columns.append(array(typecode) if typecode else [])
+
+    return columns
+
+
+# views of a row of a LazyRecordArray, by record type. See _get_row_type.
+_row_types: Dict[Type, Type] = {}
+
+
+def _get_row_type(record_type: Type) -> Type:
+    """
+    Get the class of views of a row of a LazyRecordArray holding record_type, creating it if needed. Each field is a
+    property reading or writing its column. Anything else, such as properties, is taken from record_type.
+    """
+    row_type = _row_types.get(record_type)
+    if row_type is not None:
+        return row_type
+
+    namespace: Dict[str, Any] = {
+        "__slots__": ("_columns", "_index"),
+        "__attrs_attrs__": record_type.__attrs_attrs__,  # so attr.asdict and attr.fields treat rows as records
+        "record_type": record_type,
+        "__init__": _init_row,
+        "__repr__": lambda row: repr(_row_to_record(row)),
+        "__eq__": _are_rows_equal,
+        "__hash__": None,
+    }
+    for name, value in vars(record_type).items():
+        if isinstance(value, property):
+            namespace[name] = value
+
+    # frozen attrs classes replace __setattr__, and their rows are read only in turn
+    is_frozen = record_type.__setattr__ is not object.__setattr__
+    for index, field in enumerate(attr.fields(record_type)):
+        namespace[field.name] = _create_column_property(index, field.name, is_frozen)
+
+    row_type = _row_types[record_type] = type(record_type.__name__ + "Row", (), namespace)
+    return row_type
+
+
+def _init_row(row: Any, columns: List[Union[array, List[Any]]], index: int):
+    row._columns = columns
+    row._index = index
+
+
+def _row_to_record(row: Any) -> Any:
+    """
+    Copy a row of a LazyRecordArray out into a record.
+    """
+    fields = row.__attrs_attrs__
+    return row.record_type(*(getattr(row, field.name) for field in fields))
+
+
+def _are_rows_equal(row: Any, other: Any) -> bool:
+    """
+    Check whether a row of a LazyRecordArray holds the same values as another row, or a record.
+    """
+    if type(other) is type(row):
+        other = _row_to_record(other)
+    return _row_to_record(row) == other
+
+
+def _create_column_property(column_index: int, name: str, is_read_only: bool) -> property:
+    """
+    Create a property reading, and writing unless read only, one column of a LazyRecordArray at a row view's index.
+    """
+    def get_value(row):
+        return row._columns[column_index][row._index]
+
+    def set_value(row, value):
+        row._columns[column_index][row._index] = value
+
+    return property(get_value, None if is_read_only else set_value, doc=name)
+
+
+# list components hold records either as objects, or as columns when USE_ARRAY_BACKED_COMPONENTS is set
+RecordList = LazyRecordArray if USE_ARRAY_BACKED_COMPONENTS else LazyList
+
+
+################ COMPONENTS ##########################
+
+@register_component
+class Population(RecordList[Demographic], Component):  # type: ignore
+    __slots__ = ()
+    record_type = Demographic
+
+
+@register_component
+class Details(Component):
+    __slots__ = ("kingdom_name", )
 
-class Details(RegisteredComponent):
     def __init__(self, name: str):
         self.kingdom_name = name
 
@@ -108,23 +415,14 @@ class Details(RegisteredComponent):
     def deserialize(cls, serialized):
         return Details(serialized)
 
-class Demesne(List[Land], RegisteredComponent):
-    def serialize(self):
-        _dict = {}
-        for land in self:
-            _dict[land.name] = attr.asdict(land)
-
-        return _dict
-
-    @classmethod
-    def deserialize(cls, serialized):
-        land_list = []
-        for key, land in serialized.items():
-            land_list.append(Land(**land))
-        return Demesne(land_list)
+@register_component
+class Demesne(RecordList[Land], Component):  # type: ignore
+    __slots__ = ()
+    record_type = Land
 
 
-class IsPlayerControlled(RegisteredComponent):
+@register_component
+class IsPlayerControlled(Component):
     __slots__ = ()
 
     def serialize(self):
@@ -135,23 +433,16 @@ class IsPlayerControlled(RegisteredComponent):
         return IsPlayerControlled()
 
 
-class CastleStaff(List[StaffMember], RegisteredComponent):
-    def serialize(self):
-        _dict = {}
-        for staff_member in self:
-            _dict[staff_member.name] = attr.asdict(staff_member)
+@register_component
+class CastleStaff(RecordList[StaffMember], Component):  # type: ignore
+    __slots__ = ()
+    record_type = StaffMember
 
-        return _dict
 
-    @classmethod
-    def deserialize(cls, serialized):
-        staff_list = []
-        for key, staff_member in serialized.items():
-            staff_list.append(StaffMember(**staff_member))
-        return CastleStaff(staff_list)
+@register_component
+class Hourglass(Component):
+    __slots__ = ("minutes_available", )
 
-
-class Hourglass(RegisteredComponent):
     def __init__(self, minutes_available: int = MINUTES_IN_DAY):
         self.minutes_available = minutes_available
 
@@ -161,4 +452,3 @@ class Hourglass(RegisteredComponent):
     @classmethod
     def deserialize(cls, serialized):
         return Hourglass(serialized)
-
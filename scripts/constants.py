@@ -7,15 +7,40 @@ if TYPE_CHECKING:
 
 VERSION = "0.0.1"
 
+DATA_PATH = "data/"
+CATALOG_CACHE_PATH = "data/cache/"  # compiled data files, see catalog.load_catalog
+CATALOG_CACHE_VERSION = 1
+
 SAVE_PATH = "saves/"
+SAVE_EXTENSION = ".json"
+SAVE_FORMAT_VERSION = 3
+SAVE_CATALOG_FILENAME = "catalog.json"  # summary of every save, read by the load screen
+JOURNAL_EXTENSION = ".journal"
+AUTOSAVE_BASE_INTERVAL = 30  # days between full autosaves. Autosaves in between only record changes.
+# dated autosaves are copies of full autosaves, so are AUTOSAVE_BASE_INTERVAL days apart, not one a day. The most recent
+# kept therefore go back AUTOSAVE_KEEP_RECENT * AUTOSAVE_BASE_INTERVAL days.
+AUTOSAVE_KEEP_RECENT = 5  # most recent dated full autosaves to keep, per kingdom
+AUTOSAVE_KEEP_SEASONS = 8  # seasons to keep the first dated full autosave of, per kingdom
 
 BASE_WINDOW_WIDTH = 1280
 BASE_WINDOW_HEIGHT = 720
 GAME_FPS = 60
+MENU_FPS = 20  # menus only change in response to input, so need fewer frames
+USE_DIRTY_RECT_RENDERING = True  # only redraw what has changed, and skip drawing when nothing has
+USE_SCREEN_CACHE = True  # hide screens when leaving them and show them again when returning, rather than rebuilding
+SCREEN_CACHE_MAX_BYTES = 64 * 1024 * 1024  # estimated image memory of cached screens before least recently used go
 
 EXIT = -1
 INITIALISING = 0
+MAIN_MENU = 1
+PLAYING = 2  # a game has been started or loaded
 
+# most frames per second in each game state. States not listed use GAME_FPS.
+FRAME_CAPS = {
+    INITIALISING: GAME_FPS,
+    MAIN_MENU: MENU_FPS,
+}
+IDLE_WAIT_TIMEOUT = 500  # ms to sleep waiting for input when nothing is animating. A blinking cursor waits less.
 
 LINE_BREAK = "<br>"
 
@@ -23,3 +48,44 @@ MINUTES_IN_DAY = 600
 DAYS_IN_SEASON = 30
 SEASONS_IN_YEAR = 4
 DAYS_IN_YEAR = DAYS_IN_SEASON * SEASONS_IN_YEAR
+
+# check the world's indexes against full queries at the end of each day. Slow, for debugging only.
+CHECK_WORLD_INDEXES = False
+
+# logging. LOG_LEVEL applies to anything without its own level in LOG_LEVELS, keyed by logger name.
+LOG_FILE = "logs/game.log"
+LOG_LEVEL = "DEBUG"
+LOG_LEVELS = {
+    "scripts.ui": "INFO",  # logs every element moved between frames
+    "scripts.debug": "INFO",  # logs every frame over budget
+    "scripts.persistence": "INFO",
+}
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 5  # old logs kept, including those from previous sessions
+
+# profiling. Mode is one of the PROFILING_* values, and can be overridden with the PROFILING_MODE environment variable.
+PROFILING_OFF = "off"
+PROFILING_SAMPLING = "sampling"  # sample the main thread's stack on a background thread
+PROFILING_REGIONS = "regions"  # cProfile only the regions marked with debug.profile_region
+PROFILING_HOTKEY = "hotkey"  # cProfile everything between presses of F9
+PROFILING_MODE = PROFILING_OFF
+PROFILING_SAMPLE_HZ = 100
+PROFILING_PATH = "logs/profiling/"
+
+# frame timing. Each phase of the game loop is timed and the last FRAME_TIMING_SIZE frames kept. F3 shows the overlay.
+RECORD_FRAME_TIMINGS = True
+FRAME_TIMING_SIZE = 3600
+FRAME_TIMING_WINDOW = 120  # frames the overlay's figures are taken over
+FRAME_BUDGET = 1 / GAME_FPS  # seconds of work, excluding waiting, before a frame is over budget
+FRAME_TIMING_PATH = "logs/"
+
+# process births and deaths as batched numpy array operations, when numpy is installed
+USE_VECTORISED_DEMOGRAPHY = True
+# hold the records of list components, such as Population, as columns of arrays rather than an object each. Uses far
+# less memory for large worlds, but each access builds a view of the row.
+USE_ARRAY_BACKED_COMPONENTS = False
+
+# shard vectorised births and deaths across worker processes, see demography.process_births_and_deaths
+USE_PARALLEL_DEMOGRAPHY = True
+DEMOGRAPHY_WORKERS = None  # worker processes. None for one per core.
+PARALLEL_DEMOGRAPHY_THRESHOLD = 250_000  # demographic days stepped in a call before sharding is worth the overhead
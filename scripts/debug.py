@@ -1,22 +1,38 @@
 from __future__ import annotations
 
 import cProfile
+import csv
 import datetime
-import io
-
 import logging
+import math
+import os
 import pstats
+import queue
+import sys
+import threading
 import time
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from typing import TYPE_CHECKING, Type
 
 from snecs import Component
 from snecs.typedefs import EntityID
 
 from scripts import world
-from scripts.constants import VERSION
+from scripts.constants import FRAME_BUDGET, FRAME_TIMING_PATH, FRAME_TIMING_SIZE, FRAME_TIMING_WINDOW, \
+    LOG_BACKUP_COUNT, LOG_FILE, LOG_LEVEL, LOG_LEVELS, LOG_MAX_BYTES, PROFILING_HOTKEY, PROFILING_MODE, PROFILING_OFF, \
+    PROFILING_PATH, PROFILING_REGIONS, PROFILING_SAMPLE_HZ, PROFILING_SAMPLING, RECORD_FRAME_TIMINGS, VERSION
+from scripts.stores.debug_data import debug_data
 
 if TYPE_CHECKING:
-    from typing import Union, Optional, Any, Tuple, Dict, List
+    from typing import Union, Optional, Any, Tuple, Dict, List, Set, Iterator
+    import pygame
+
+
+logger = logging.getLogger(__name__)
+
+# phases of the game loop spent waiting rather than working, so not counted against the frame budget
+WAITING_PHASES = ("tick", "idle")
 
 
 def log_component_not_found(entity: EntityID, component: Type[Component]):
@@ -28,6 +44,33 @@ def log_component_not_found(entity: EntityID, component: Type[Component]):
     logging.warning(f"'{name}'({entity}) tried to get {component.__name__}, but it was not found.")
 
 
+def check_world_indexes() -> bool:
+    """
+    Check the world's indexes agree with a full query of the world. Log any disagreement as an error.
+    """
+    is_consistent = True
+    for component in world.INDEXED_FLAG_COMPONENTS:
+        queried = {entity for entity, (flag, ) in world.get_components([component])}
+        indexed = world.get_flagged_entities(component)
+        if queried != indexed:
+            logging.error(f"Index of {component.__name__} holds {indexed}, but a query found {queried}.")
+            is_consistent = False
+
+    for index_name, (component, get_keys) in world.SECONDARY_INDEXES.items():
+        queried_index: Dict[Any, Set[EntityID]] = {}
+        for entity, (instance, ) in world.get_components([component]):
+            for key in get_keys(instance):
+                queried_index.setdefault(key, set()).add(entity)
+
+        for key, entities in queried_index.items():
+            indexed = world.get_entities_by_index(index_name, key)
+            if indexed != entities:
+                logging.error(f"Index '{index_name}' holds {indexed} for {key}, but a query found {entities}.")
+                is_consistent = False
+
+    return is_consistent
+
+
 def initialise_logging():
     """
     Configure logging
@@ -39,64 +82,417 @@ def initialise_logging():
         INFO - Confirmation that things are working as expected.
         DEBUG - Detailed information, typically of interest only when diagnosing problems
 
-    File mode options:
-        'r' - open for reading(default)
-        'w' - open for writing, truncating the file first
-        'x' - open for exclusive creation, failing if the file already exists
-        'a' - open for writing, appending to the end of the file if it exists
-
+    Records are queued by the game thread and written to file by a listener thread, so logging never waits on the
+    disk. Each session starts a new log, with the previous LOG_BACKUP_COUNT kept, and a log over LOG_MAX_BYTES is
+    rolled over. Levels can be set per subsystem in LOG_LEVELS.
     """
-
-    log_file_name = "logs/game.log"
-    log_level = logging.DEBUG
-    file_mode = "w"
+    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
 
     for handler in logging.root.handlers[:]:
         logging.root.removeHandler(handler)
 
     # 8 adds space for 8 characters (# CRITICAL)
-    log_format = "%(asctime)s| %(levelname)-8s| %(message)s"
-    logging.basicConfig(filename=log_file_name, filemode=file_mode, level=log_level, format=log_format)
+    log_format = "%(asctime)s| %(levelname)-8s| %(name)s| %(message)s"
+
+    # the file is only written to by the listener
+    file_handler = RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
+    file_handler.setFormatter(logging.Formatter(log_format))
+    if os.path.getsize(LOG_FILE):
+        file_handler.doRollover()
+
+    log_queue = queue.SimpleQueue()
+    logging.root.addHandler(QueueHandler(log_queue))
+    logging.root.setLevel(LOG_LEVEL)
+    for logger_name, level in LOG_LEVELS.items():
+        logging.getLogger(logger_name).setLevel(level)
+
+    debug_data.log_listener = QueueListener(log_queue, file_handler)
+    debug_data.log_listener.start()
 
     # format into uk time
     logging.Formatter.converter = time.gmtime
 
 
-def create_profiler():
+@contextmanager
+def trace_startup(step: str) -> Iterator[None]:
     """
-    Create and enable the profiler
+    Time a step of starting the game and log how long it took.
     """
+    start = time.perf_counter()
+    yield
+    logger.info("Startup step '%s' took %.1fms.", step, (time.perf_counter() - start) * 1000)
+
+
+def trace_first_frame():
+    """
+    Log the time from the game starting, i.e. this module being imported, to the first frame being drawn. Only logs
+    the first time it is called.
+    """
+    if debug_data.is_first_frame_traced:
+        return
+
+    debug_data.is_first_frame_traced = True
+    logger.info("First frame drawn %.1fms after starting.", (time.perf_counter() - debug_data.started_at) * 1000)
+
+
+def initialise_profiling(mode: Optional[str] = None):
+    """
+    Start profiling in the given mode. If no mode is given, use the PROFILING_MODE environment variable, falling back
+    to the PROFILING_MODE constant.
+    """
+    if mode is None:
+        mode = os.environ.get("PROFILING_MODE", PROFILING_MODE)
+
+    if mode not in (PROFILING_OFF, PROFILING_SAMPLING, PROFILING_REGIONS, PROFILING_HOTKEY):
+        logging.warning(f"Profiling mode '{mode}' not recognised. Profiling is off.")
+        mode = PROFILING_OFF
+
+    debug_data.profiling_mode = mode
+
+    if mode == PROFILING_SAMPLING:
+        debug_data.is_sampling = True
+        debug_data.sampler_thread = threading.Thread(target=_sample_main_thread, name="profiling_sampler",
+                                                     daemon=True)
+        debug_data.sampler_thread.start()
+
+    logging.info(f"Profiling mode is {mode}.")
+
+
+@contextmanager
+def profile_region(name: str):
+    """
+    Mark a region of code to be profiled, such as one end of day or one save. Only profiled in the regions mode.
+    Stats for regions sharing a name are combined. A region within another is included in the outer region only, as
+    cProfile cant be nested. Can be used as a decorator.
+    """
+    if debug_data.profiling_mode != PROFILING_REGIONS or debug_data.is_profiling_region:
+        yield
+        return
+
     profiler = cProfile.Profile()
+    debug_data.is_profiling_region = True
     profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        debug_data.is_profiling_region = False
+
+        if name in debug_data.region_stats:
+            debug_data.region_stats[name].add(profiler)
+        else:
+            debug_data.region_stats[name] = pstats.Stats(profiler)
 
-    return profiler
+
+def toggle_hotkey_profiling():
+    """
+    Start profiling if stopped, or stop and dump the data if started. Only works in the hotkey mode.
+    """
+    if debug_data.profiling_mode != PROFILING_HOTKEY:
+        return
+
+    if debug_data.hotkey_profiler is None:
+        debug_data.hotkey_profiler = cProfile.Profile()
+        debug_data.hotkey_profiler.enable()
+        logging.info(f"Hotkey profiling started.")
+    else:
+        debug_data.hotkey_profiler.disable()
+        dump_profiling_data(pstats.Stats(debug_data.hotkey_profiler), "hotkey")
+        debug_data.hotkey_profiler = None
+        logging.info(f"Hotkey profiling stopped.")
+
+
+def start_frame():
+    """
+    Start timing a new frame, finishing the last. Call before the first phase of the game loop.
+    """
+    if not RECORD_FRAME_TIMINGS:
+        return
+
+    if debug_data.frame_index >= 0:
+        _finish_frame()
+
+    # reuse the oldest slot in the ring buffer
+    index = (debug_data.frame_index + 1) % FRAME_TIMING_SIZE
+    for times in debug_data.phase_times.values():
+        times[index] = 0.0
+    debug_data.over_budget[index] = False
+    debug_data.frame_index = index
+
+    debug_data.phase_start = time.perf_counter()
+
+
+def mark_phase(name: str):
+    """
+    Record the time since the last phase ended, or since the frame started, as spent in the named phase.
+    """
+    if not RECORD_FRAME_TIMINGS or debug_data.frame_index < 0:
+        return
+
+    now = time.perf_counter()
+    times = debug_data.phase_times.get(name)
+    if times is None:
+        times = debug_data.phase_times[name] = [0.0] * FRAME_TIMING_SIZE
+    times[debug_data.frame_index] += now - debug_data.phase_start
+    debug_data.phase_start = now
+
+
+def get_frame_stats(window: int = FRAME_TIMING_WINDOW) -> Dict[str, Dict[str, float]]:
+    """
+    Get the p50, p95, p99 and max seconds spent in each phase, and in all work, over the last window of frames. Also
+    gets how many of those frames were over budget, under "over_budget".
+    """
+    indexes = _get_recent_frame_indexes(window)
+    if not indexes:
+        return {}
+
+    stats = {}
+    for name, times in debug_data.phase_times.items():
+        stats[name] = _get_percentiles([times[index] for index in indexes])
+    stats["work"] = _get_percentiles([_get_work_time(index) for index in indexes])
+    stats["over_budget"] = {"frames": sum(debug_data.over_budget[index] for index in indexes), "of": len(indexes)}
+
+    return stats
+
+
+def toggle_frame_overlay():
+    """
+    Show or hide the frame timing overlay.
+    """
+    debug_data.is_frame_overlay_shown = not debug_data.is_frame_overlay_shown
+
+
+def is_frame_overlay_shown() -> bool:
+    """
+    Check if the frame timing overlay should be drawn.
+    """
+    return debug_data.is_frame_overlay_shown
+
+
+def draw_frame_overlay(surface: pygame.Surface):
+    """
+    Draw the frame timing stats, in milliseconds, in the top left of the surface.
+    """
+    import pygame
+
+    stats = get_frame_stats()
+    if not stats:
+        return
+
+    over_budget = stats.pop("over_budget")
+    lines = [f"{'phase':<10}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}"]
+    for name, percentiles in stats.items():
+        lines.append(f"{name:<10}" + "".join(f"{percentiles[key] * 1000:8.2f}" for key in ("p50", "p95", "p99", "max")))
+    lines.append(f"over budget: {over_budget['frames']} of {over_budget['of']} frames")
+
+    if debug_data.overlay_font is None:
+        debug_data.overlay_font = pygame.font.SysFont("monospace", 14)
+    font = debug_data.overlay_font
+
+    line_height = font.get_linesize()
+    background = pygame.Surface((font.size(lines[0])[0] + 10, line_height * len(lines) + 10), pygame.SRCALPHA)
+    background.fill((0, 0, 0, 200))
+    surface.blit(background, (0, 0))
+    for line_number, line in enumerate(lines):
+        surface.blit(font.render(line, True, (255, 255, 255)), (5, 5 + line_number * line_height))
+
+
+def export_frame_timings():
+    """
+    Write the recorded frame timings, oldest first, to a csv file. One row per frame, in seconds.
+    """
+    indexes = list(reversed(_get_recent_frame_indexes(FRAME_TIMING_SIZE)))
+    if not indexes:
+        return
+
+    os.makedirs(FRAME_TIMING_PATH, exist_ok=True)
+    date_and_time = datetime.datetime.utcnow()
+    filename = FRAME_TIMING_PATH + date_and_time.strftime("%Y%m%d@%H%M") + "_" + VERSION + "_frame_timings.csv"
+
+    phase_names = list(debug_data.phase_times)
+    with open(filename, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["frame"] + phase_names + ["work", "over_budget"])
+        for frame, index in enumerate(indexes):
+            writer.writerow([frame] + [debug_data.phase_times[name][index] for name in phase_names] +
+                            [_get_work_time(index), debug_data.over_budget[index]])
+
+    logging.info(f"Exported {len(indexes)} frame timings to {filename}.")
+
+
+def _finish_frame():
+    """
+    Check the current frame against the budget.
+    """
+    index = debug_data.frame_index
+    work_time = _get_work_time(index)
+    debug_data.frames_recorded += 1
+
+    if work_time > FRAME_BUDGET:
+        debug_data.over_budget[index] = True
+        logger.debug("Frame over budget, %.2fms of work.", work_time * 1000)
+
+
+def _get_work_time(index: int) -> float:
+    """
+    Get the seconds spent working, rather than waiting, in the frame at index in the ring buffer.
+    """
+    return sum(times[index] for name, times in debug_data.phase_times.items() if name not in WAITING_PHASES)
+
+
+def _get_recent_frame_indexes(window: int) -> List[int]:
+    """
+    Get the indexes in the ring buffer of up to window finished frames, most recent first.
+    """
+    count = min(window, debug_data.frames_recorded, FRAME_TIMING_SIZE - 1)
+    return [(debug_data.frame_index - offset) % FRAME_TIMING_SIZE for offset in range(1, count + 1)]
+
+
+def _get_percentiles(values: List[float]) -> Dict[str, float]:
+    """
+    Get the p50, p95, p99 and max of values, by nearest rank.
+    """
+    ordered = sorted(values)
+    last = len(ordered) - 1
+    return {
+        "p50": ordered[min(last, math.ceil(0.50 * len(ordered)) - 1)],
+        "p95": ordered[min(last, math.ceil(0.95 * len(ordered)) - 1)],
+        "p99": ordered[min(last, math.ceil(0.99 * len(ordered)) - 1)],
+        "max": ordered[last]
+    }
 
 
 def disable_logging():
     """
     Turn off current logging and clear logging resources
     """
+    # write out anything still queued
+    if debug_data.log_listener is not None:
+        debug_data.log_listener.stop()
+        debug_data.log_listener = None
+
     logging.shutdown()
 
 
-def disable_profiling(profiler):
+def disable_profiling():
     """
-    Turn off current profiling
+    Turn off current profiling and dump whatever has been gathered
     """
-    profiler.disable()
+    mode = debug_data.profiling_mode
+
+    if mode == PROFILING_SAMPLING:
+        debug_data.is_sampling = False
+        debug_data.sampler_thread.join()
+        _write_collapsed_stacks(debug_data.samples, "sampling")
+
+    elif mode == PROFILING_REGIONS:
+        for name, stats in debug_data.region_stats.items():
+            dump_profiling_data(stats, name)
+
+    elif mode == PROFILING_HOTKEY and debug_data.hotkey_profiler is not None:
+        toggle_hotkey_profiling()
+
+    debug_data.profiling_mode = PROFILING_OFF
 
 
-def dump_profiling_data(profiler):
+def dump_profiling_data(stats: pstats.Stats, name: str):
     """
-    Dump data to a readable file
+    Dump data to a readable file, plus a collapsed stack file for flame graph tools
     """
+    os.makedirs(PROFILING_PATH, exist_ok=True)
+
     # dump the profiler stats
-    s = io.StringIO()
-    ps = pstats.Stats(profiler, stream=s).sort_stats("cumulative")
-    ps.dump_stats("logs/profiling/profile.dump")
+    stats.dump_stats(PROFILING_PATH + name + ".dump")
 
     # convert profiling to human readable format
+    with open(_get_profiling_filename(name) + ".profile", "w") as out_stream:
+        pstats.Stats(PROFILING_PATH + name + ".dump", stream=out_stream).strip_dirs().sort_stats(
+            "cumulative").print_stats()
+
+    _write_collapsed_stacks(_collapse_stats(stats), name)
+
+
+def _sample_main_thread():
+    """
+    Record the main thread's stack PROFILING_SAMPLE_HZ times a second, until sampling stops. Runs on the sampler
+    thread.
+    """
+    main_thread_id = threading.main_thread().ident
+    interval = 1 / PROFILING_SAMPLE_HZ
+    samples = debug_data.samples
+
+    while debug_data.is_sampling:
+        frame = sys._current_frames().get(main_thread_id)
+
+        stack = []
+        while frame is not None:
+            stack.append(_get_frame_name(frame.f_code.co_filename, frame.f_code.co_firstlineno, frame.f_code.co_name))
+            frame = frame.f_back
+
+        if stack:
+            samples[";".join(reversed(stack))] += 1
+
+        time.sleep(interval)
+
+
+def _collapse_stats(stats: pstats.Stats) -> Dict[str, int]:
+    """
+    Estimate collapsed stacks, in microseconds, from cProfile's caller and callee totals. cProfile doesnt record full
+    stacks, so where a function has several callers its time is split between them by their share of its calls.
+    """
+    all_stats = stats.stats
+    callees: Dict[Tuple, Dict[Tuple, float]] = {}
+    for function, (primitive_calls, calls, own_time, cumulative_time, callers) in all_stats.items():
+        for caller, caller_stats in callers.items():
+            callees.setdefault(caller, {})[function] = caller_stats[3]
+
+    collapsed: Dict[str, int] = {}
+
+    def walk(function: Tuple, stack: List[str], share: float):
+        own_time, cumulative_time = all_stats[function][2:4]
+        stack = stack + [_get_frame_name(*function)]
+        microseconds = int(own_time * share * 1_000_000)
+        if microseconds:
+            key = ";".join(stack)
+            collapsed[key] = collapsed.get(key, 0) + microseconds
+
+        for callee, edge_time in callees.get(function, {}).items():
+            callee_time = all_stats[callee][3]
+
+            # skip recursion and anything too small to show
+            if callee_time <= 0 or _get_frame_name(*callee) in stack or edge_time * share < 0.000001:
+                continue
+
+            walk(callee, stack, min(1.0, edge_time * share / callee_time))
+
+    for function, function_stats in all_stats.items():
+        if not function_stats[4]:
+            walk(function, [], 1.0)
+
+    return collapsed
+
+
+def _write_collapsed_stacks(collapsed: Dict[str, int], name: str):
+    """
+    Write stacks in the collapsed format read by flame graph tools, one "frame;frame;frame count" per line.
+    """
+    os.makedirs(PROFILING_PATH, exist_ok=True)
+
+    with open(_get_profiling_filename(name) + ".collapsed", "w") as file:
+        for stack, count in sorted(collapsed.items()):
+            file.write(f"{stack} {count}\n")
+
+
+def _get_frame_name(filename: str, line_number: int, function_name: str) -> str:
+    """
+    Get a short name for a function, as shown in collapsed stacks.
+    """
+    return f"{function_name} ({os.path.basename(filename)}:{line_number})"
+
+
+def _get_profiling_filename(name: str) -> str:
+    """
+    Get the path and name, without extension, for profiling output of the given name.
+    """
     date_and_time = datetime.datetime.utcnow()
-    out_stream = open("logs/profiling/" + date_and_time.strftime("%Y%m%d@%H%M") + "_" + VERSION + ".profile", "w")
-    ps = pstats.Stats("logs/profiling/profile.dump", stream=out_stream)
-    ps.strip_dirs().sort_stats("cumulative").print_stats()
\ No newline at end of file
+    return PROFILING_PATH + date_and_time.strftime("%Y%m%d@%H%M") + "_" + VERSION + "_" + name
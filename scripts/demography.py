@@ -0,0 +1,439 @@
+from __future__ import annotations
+
+import logging
+import os
+from operator import attrgetter
+from typing import TYPE_CHECKING
+
+from scripts import rng
+from scripts.constants import DAYS_IN_YEAR, PARALLEL_DEMOGRAPHY_THRESHOLD, USE_PARALLEL_DEMOGRAPHY, \
+    USE_VECTORISED_DEMOGRAPHY
+from scripts.stores.demography_data import demography_data
+
+if TYPE_CHECKING:
+    from typing import Union, Optional, Any, Tuple, Dict, List, Iterable
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing.shared_memory import SharedMemory
+    from snecs.typedefs import EntityID
+    from scripts.components import Demographic, Population
+
+
+logger = logging.getLogger(__name__)
+
+
+# numpy is optional. Without it we fall back to stepping each demographic in turn. It is slow to import, so is only
+# imported when first needed, see _import_numpy.
+np = None
+_is_numpy_missing = False
+
+# name and type of each column, in the order they are laid out in shared memory. All are 8 bytes wide.
+COLUMNS = (
+    ("entities", "int64"),
+    ("positions", "int64"),
+    ("amount", "int64"),
+    ("birth_rate", "float64"),
+    ("min_brood", "int64"),
+    ("max_brood", "int64"),
+    ("lifespan", "float64"),
+    ("accrued_births", "float64"),
+    ("accrued_deaths", "float64"),
+)
+
+# the block of shared memory a worker process last attached to, see _advance_shard
+_attached_memory: Optional[SharedMemory] = None
+
+
+class DemographicColumns:
+    """
+    Every demographic across every population, held as parallel columns. Row i of each column describes sources[i],
+    which is the demographic at positions[i] in the population of entities[i].
+    """
+    def __init__(self, sources: List[Demographic], entities: List[EntityID], positions: List[int]):
+        count = len(sources)
+
+        self.sources: List[Demographic] = sources
+        self.entities = np.fromiter(entities, np.int64, count)
+        self.positions = np.fromiter(positions, np.int64, count)
+        self.amount = np.fromiter(map(attrgetter("amount"), sources), np.int64, count)
+        self.birth_rate = np.fromiter(map(attrgetter("birth_rate"), sources), np.float64, count)
+        self.min_brood = np.fromiter(map(attrgetter("min_brood"), sources), np.int64, count)
+        self.max_brood = np.fromiter(map(attrgetter("max_brood"), sources), np.int64, count)
+        self.lifespan = np.fromiter(map(attrgetter("lifespan"), sources), np.float64, count)
+        self.accrued_births = np.fromiter(map(attrgetter("accrued_births"), sources), np.float64, count)
+        self.accrued_deaths = np.fromiter(map(attrgetter("accrued_deaths"), sources), np.float64, count)
+
+    @classmethod
+    def gather_into(cls, buffer: memoryview, sources: List[Demographic], entities: List[EntityID],
+            positions: List[int]) -> DemographicColumns:
+        """
+        Gather columns as __init__ does, but laid out in buffer, as by COLUMNS.
+        """
+        gathered = cls(sources, entities, positions)
+
+        columns = cls.from_buffer(buffer, len(sources))
+        columns.sources = sources
+        for name, dtype in COLUMNS:
+            getattr(columns, name)[:] = getattr(gathered, name)
+
+        return columns
+
+    @classmethod
+    def from_buffer(cls, buffer: memoryview, count: int, start: int = 0, end: Optional[int] = None) \
+            -> DemographicColumns:
+        """
+        View rows start to end of columns laid out in buffer, as by COLUMNS, without copying them. There are no
+        sources.
+        """
+        end = count if end is None else end
+
+        columns = cls.__new__(cls)
+        columns.sources = []
+        for index, (name, dtype) in enumerate(COLUMNS):
+            column = np.ndarray((count, ), dtype, buffer, index * count * 8)
+            setattr(columns, name, column[start:end])
+
+        return columns
+
+
+############################# GET - RETURN AN EXISTING SOMETHING ###########################
+
+def get_worker_count() -> int:
+    """
+    Get how many worker processes births and deaths are sharded across.
+    """
+    return demography_data.worker_count or os.cpu_count() or 1
+
+
+def get_columns(populations: List[Tuple[EntityID, Population]]) -> Optional[DemographicColumns]:
+    """
+    Get every demographic in the populations as columns. The columns are kept between calls and only gathered again
+    if the populations differ from last time, e.g. a demographic was added or removed, or anything else has changed a
+    population since, going by the world's revision. None if there are no demographics.
+    """
+    # imported here so worker processes dont need the world
+    from scripts import world
+    from scripts.components import Population
+
+    layout = [(entity, population, len(population)) for entity, population in populations]
+    if demography_data.columns is not None and demography_data.revision == world.get_revision([Population]) and \
+            _is_same_layout(layout, demography_data.layout):
+        return demography_data.columns
+
+    discard_columns()
+
+    sources = []
+    entities = []
+    positions = []
+    for entity, population in populations:
+        for position, demographic in enumerate(population):
+            sources.append(demographic)
+            entities.append(entity)
+            positions.append(position)
+    if not sources:
+        return None
+
+    # kept where the workers can step them, if they might
+    if can_share_columns():
+        memory = _get_shared_memory(len(sources) * len(COLUMNS) * 8)
+        columns = DemographicColumns.gather_into(memory.buf, sources, entities, positions)
+    else:
+        columns = DemographicColumns(sources, entities, positions)
+
+    demography_data.columns = columns
+    demography_data.layout = layout
+    logger.debug("Gathered %s demographics into columns.", len(sources))
+
+    return columns
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """
+    Get the pool of worker processes, starting it if it isnt running.
+    """
+    if demography_data.executor is None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # spawned rather than forked, so workers dont inherit the display or locks held by other threads
+        context = multiprocessing.get_context("spawn")
+        demography_data.executor = ProcessPoolExecutor(get_worker_count(), mp_context=context)
+        logger.info("Started %s demography workers.", get_worker_count())
+
+    return demography_data.executor
+
+
+############################ CHECKS ##############################
+
+def can_vectorise() -> bool:
+    """
+    Check whether the vectorised engine is enabled and its dependencies are available.
+    """
+    return USE_VECTORISED_DEMOGRAPHY and _import_numpy()
+
+
+def can_share_columns() -> bool:
+    """
+    Check whether the columns can be kept in memory shared with worker processes, so they can be sharded.
+    """
+    if not USE_PARALLEL_DEMOGRAPHY or get_worker_count() < 2:
+        return False
+
+    try:
+        from multiprocessing import shared_memory
+    except ImportError:
+        return False
+
+    return True
+
+
+def can_shard(count: int, days: int) -> bool:
+    """
+    Check whether stepping count demographics over a number of days is worth sharding across worker processes.
+    """
+    return count * days >= PARALLEL_DEMOGRAPHY_THRESHOLD and can_share_columns()
+
+
+def _is_same_layout(layout: List[Tuple[EntityID, Population, int]],
+        other_layout: List[Tuple[EntityID, Population, int]]) -> bool:
+    """
+    Check whether two layouts, of entity, population and its length, describe the same populations.
+    """
+    if len(layout) != len(other_layout):
+        return False
+
+    for (entity, population, length), (other_entity, other_population, other_length) in zip(layout, other_layout):
+        if entity != other_entity or population is not other_population or length != other_length:
+            return False
+
+    return True
+
+
+################################ ACTIONS - CHANGE STATE - RETURN NOTHING ###############################
+
+def process_births_and_deaths(populations: Iterable[Tuple[EntityID, Population]], seed: int, first_day: int,
+        days: int = 1):
+    """
+    Accrue births and deaths over a number of days for every demographic in the given populations, keyed by the
+    entity they belong to, applying any that are due, and mark the populations dirty in the world. Each day is stepped
+    in turn so the result matches calling this once per day. Random draws come from the seed, so the result is the
+    same however it is computed.
+    The vectorised engine keeps the demographics as columns between calls, see get_columns, so each call only steps
+    the columns and copies the results back on to the Demographics.
+    """
+    from scripts import world
+    from scripts.components import Population
+
+    populations = list(populations)
+
+    if can_vectorise():
+        columns = get_columns(populations)
+        if columns is not None:
+            is_sharded = False
+            if can_shard(len(columns.sources), days):
+                try:
+                    advance_sharded(columns, seed, first_day, days)
+                    is_sharded = True
+                except Exception:
+                    logger.exception("Demography workers failed. Stepping births and deaths in this process instead.")
+
+                # outside the except, so nothing still views the shared memory when it is freed. The columns may be
+                # part stepped, but the Demographics are untouched, so gather them again.
+                if not is_sharded:
+                    shutdown_workers()
+                    columns = get_columns(populations)
+
+            if not is_sharded:
+                for day in range(first_day, first_day + days):
+                    advance_columns(columns, seed, day)
+            write_back_columns(columns)
+
+    else:
+        for entity, population in populations:
+            for position, demographic in enumerate(population):
+                for day in range(first_day, first_day + days):
+                    advance_demographic(demographic, seed, entity, position, day)
+
+    for entity, population in populations:
+        world.mark_dirty(entity, Population)
+
+    # the columns now match the world, so can be used as they are next time, unless anything else changes it
+    demography_data.revision = world.get_revision([Population])
+
+
+def advance_demographic(demographic: Demographic, seed: int, entity: EntityID, position: int, day: int):
+    """
+    Accrue a single day's births and deaths for one demographic, applying any that are due. The demographic is at
+    position in the population of entity.
+    """
+    accrued_births = demographic.accrued_births
+    accrued_deaths = demographic.accrued_deaths
+
+    accrued_births += demographic.birth_rate_in_year / DAYS_IN_YEAR
+    accrued_deaths += demographic.amount / (demographic.lifespan * DAYS_IN_YEAR)
+
+    # handle births
+    if accrued_births >= 1:
+        births = int(accrued_births)
+        accrued_births -= births
+
+        # add births
+        brood = rng.randint(seed, rng.BROOD_STREAM, entity, day, position, demographic.min_brood,
+                            demographic.max_brood)
+        demographic.amount += births * brood
+
+    # handle deaths of old age
+    if accrued_deaths >= 1:
+        deaths = int(accrued_deaths)
+        accrued_deaths -= deaths
+
+        # remove deaths
+        demographic.amount -= deaths
+
+    demographic.accrued_births = accrued_births
+    demographic.accrued_deaths = accrued_deaths
+
+
+def advance_columns(columns: DemographicColumns, seed: int, day: int):
+    """
+    Accrue a single day's births and deaths for every row of the columns, applying any that are due. Mirrors
+    advance_demographic, as batched array operations.
+    """
+    amount = columns.amount
+    brood_spread = np.maximum(columns.max_brood - columns.min_brood, 1)
+
+    columns.accrued_births += (columns.birth_rate * amount) * brood_spread / DAYS_IN_YEAR
+    columns.accrued_deaths += amount / (columns.lifespan * DAYS_IN_YEAR)
+
+    # handle births. accrued values are never negative so floor matches int()
+    births = np.floor(columns.accrued_births)
+    columns.accrued_births -= births
+    broods = rng.randints(seed, rng.BROOD_STREAM, columns.entities, day, columns.positions, columns.min_brood,
+                          columns.max_brood)
+
+    # handle deaths of old age
+    deaths = np.floor(columns.accrued_deaths)
+    columns.accrued_deaths -= deaths
+
+    amount += births.astype(np.int64) * broods - deaths.astype(np.int64)
+
+
+def advance_sharded(columns: DemographicColumns, seed: int, first_day: int, days: int):
+    """
+    Have the worker processes each step a share of the rows of the columns over the days, in place. The columns must
+    be those kept in shared memory, see get_columns.
+    """
+    count = len(columns.sources)
+    memory = demography_data.shared_memory
+
+    # workers are only sent where to look, never the demographics themselves
+    shards = get_worker_count()
+    bounds = [count * shard // shards for shard in range(shards + 1)]
+    executor = get_executor()
+    futures = [executor.submit(_advance_shard, memory.name, count, start, end, seed, first_day, days)
+               for start, end in zip(bounds, bounds[1:]) if start < end]
+    for future in futures:
+        future.result()
+
+
+def set_worker_count(worker_count: Optional[int]):
+    """
+    Set how many worker processes births and deaths are sharded across. None for one per core. Running workers are
+    stopped if the count changes, and the new count started on next use.
+    """
+    if worker_count != demography_data.worker_count:
+        shutdown_workers()
+        demography_data.worker_count = worker_count
+
+
+def discard_columns():
+    """
+    Forget the columns kept between calls, so they are gathered again from the Demographics next time.
+    """
+    demography_data.columns = None
+    demography_data.layout = []
+    demography_data.revision = None
+
+
+def shutdown_workers():
+    """
+    Stop the worker processes and free the memory shared with them, along with the columns kept in it.
+    """
+    discard_columns()
+
+    if demography_data.executor is not None:
+        demography_data.executor.shutdown()
+        demography_data.executor = None
+
+    if demography_data.shared_memory is not None:
+        demography_data.shared_memory.close()
+        demography_data.shared_memory.unlink()
+        demography_data.shared_memory = None
+
+
+def write_back_columns(columns: DemographicColumns):
+    """
+    Copy the mutable columns back on to the Demographics they were gathered from.
+    """
+    rows = zip(columns.sources, columns.amount.tolist(), columns.accrued_births.tolist(),
+               columns.accrued_deaths.tolist())
+    for demographic, amount, accrued_births, accrued_deaths in rows:
+        demographic.amount = amount
+        demographic.accrued_births = accrued_births
+        demographic.accrued_deaths = accrued_deaths
+
+
+def _get_shared_memory(size: int) -> SharedMemory:
+    """
+    Get a block of memory, shared with the workers, of at least size bytes. The current block is reused if it is big
+    enough. Anything viewing the current block must be dropped first, e.g. by discard_columns.
+    """
+    from multiprocessing.shared_memory import SharedMemory
+
+    memory = demography_data.shared_memory
+    if memory is None or memory.size < size:
+        if memory is not None:
+            memory.close()
+            memory.unlink()
+
+        # leave room to grow, so a few new demographics dont mean a new block
+        memory = demography_data.shared_memory = SharedMemory(create=True, size=max(size + size // 4, 1))
+
+    return memory
+
+
+def _advance_shard(memory_name: str, count: int, start: int, end: int, seed: int, first_day: int, days: int):
+    """
+    Step rows start to end of the columns in shared memory over the days, in place. Runs in a worker process.
+    """
+    global _attached_memory
+
+    from multiprocessing.shared_memory import SharedMemory
+
+    _import_numpy()
+
+    # stay attached between calls, until the block is replaced
+    if _attached_memory is None or _attached_memory.name != memory_name:
+        if _attached_memory is not None:
+            _attached_memory.close()
+        _attached_memory = SharedMemory(memory_name)
+
+    columns = DemographicColumns.from_buffer(_attached_memory.buf, count, start, end)
+    for day in range(first_day, first_day + days):
+        advance_columns(columns, seed, day)
+
+
+def _import_numpy() -> bool:
+    """
+    Import numpy, if it hasnt been already. Returns whether it is available.
+    """
+    global np, _is_numpy_missing
+
+    if np is None and not _is_numpy_missing:
+        try:
+            import numpy
+        except ImportError:
+            _is_numpy_missing = True
+        else:
+            np = numpy
+
+    return np is not None
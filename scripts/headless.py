@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from typing import TYPE_CHECKING
+
+from scripts import demography, persistence, processors, state, world
+from scripts.components import CastleStaff, Demesne, Demographic, Details, Hourglass, IsPlayerControlled, Land, \
+    Population
+from scripts.constants import SAVE_PATH
+
+if TYPE_CHECKING:
+    from typing import Union, Optional, Any, Tuple, Dict, List
+
+
+def main():
+    """
+    The entry for running the simulation without a display. Drives processors, world and state directly and prints
+    throughput figures.
+    """
+    parser = argparse.ArgumentParser(description="Run the simulation headless and report throughput.")
+    parser.add_argument("--kingdoms", type=int, default=100, help="number of kingdoms, including the player's")
+    parser.add_argument("--demographics", type=int, default=10, help="number of demographics in each kingdom")
+    parser.add_argument("--days", type=int, default=30, help="number of days to step through one at a time")
+    parser.add_argument("--fast-forward", type=int, default=360, help="number of days to skip in a single pass")
+    parser.add_argument("--saves", type=int, default=10, help="number of times to save and load the game")
+    parser.add_argument("--seed", type=int, help="world seed, so runs can be repeated exactly. Defaults to a new one.")
+    args = parser.parse_args()
+
+    os.makedirs(SAVE_PATH, exist_ok=True)
+
+    if args.seed is not None:
+        world.set_seed(args.seed)
+
+    start = time.perf_counter()
+    create_world(args.kingdoms, args.demographics)
+    report("world created", time.perf_counter() - start, args.kingdoms, "kingdoms")
+
+    # a day at a time, autosaving as the game does
+    start = time.perf_counter()
+    for day in range(args.days):
+        processors.process_end_of_day()
+    persistence.wait_for_saves()
+    report("day by day", time.perf_counter() - start, args.days, "days")
+
+    # many days in one pass
+    start = time.perf_counter()
+    processors.fast_forward(args.fast_forward)
+    persistence.wait_for_saves()
+    report("fast forward", time.perf_counter() - start, args.fast_forward, "days")
+
+    # persistence
+    filename = ""
+    start = time.perf_counter()
+    for save in range(args.saves):
+        filename = state.save_game()
+        persistence.wait_for_saves()
+    report("save", time.perf_counter() - start, args.saves, "saves")
+
+    start = time.perf_counter()
+    for load in range(args.saves):
+        state.load_game(filename)
+    report("load", time.perf_counter() - start, args.saves, "loads")
+
+    demography.shutdown_workers()
+
+
+def create_world(kingdoms: int, demographics: int):
+    """
+    Create the player's kingdom plus AI kingdoms, each with a population built from the race data.
+    """
+    races = list(world.get_all_race_data().values())
+    lands = list(world.get_all_land_data().values())
+
+    for kingdom_number in range(kingdoms):
+        population = []
+        for demographic_number in range(demographics):
+            race_data = dict(races[demographic_number % len(races)])
+            race_data["name"] = f"{race_data['name']} {demographic_number}"
+            population.append(Demographic(**race_data))
+
+        components = [
+            Details(f"Kingdom {kingdom_number}"),
+            Population(population),
+            Demesne([Land(**lands[kingdom_number % len(lands)])]),
+            CastleStaff([]),
+            Hourglass()
+        ]
+
+        # the first kingdom belongs to the player
+        if kingdom_number == 0:
+            components.append(IsPlayerControlled())
+
+        world.create_entity(components)
+
+
+def report(name: str, duration: float, count: int, unit: str):
+    """
+    Print how long an action took and how many of it were done per second.
+    """
+    per_second = count / duration if duration else float("inf")
+    print(f"{name:<15} {count:>8} {unit:<9} in {duration:8.3f}s ({per_second:,.1f} {unit} per second)")
+
+
+if __name__ == "__main__":  # prevents being run from other modules
+    main()
@@ -4,9 +4,10 @@ import logging
 import sys
 import traceback
 import pygame
-from scripts import processors, state, ui, world
+from scripts import debug, demography, persistence, processors, state, ui, world
 from scripts.constants import EXIT
-from scripts.debug import create_profiler, disable_logging, disable_profiling, dump_profiling_data, initialise_logging
+from scripts.debug import disable_logging, disable_profiling, export_frame_timings, initialise_logging, \
+    initialise_profiling
 
 
 def main():
@@ -14,10 +15,18 @@ def main():
     The entry for the game initialisation and game loop
     """
     # initialise logging
-    initialise_logging()
+    with debug.trace_startup("logging"):
+        initialise_logging()
 
     # initialise profiling
-    profiler = create_profiler()
+    with debug.trace_startup("profiling"):
+        initialise_profiling()
+
+    # open the window
+    ui.initialise()
+
+    # pick up saves added or removed since the catalog was last written
+    state.reconcile_save_catalog()
 
     # run the game
     try:
@@ -32,8 +41,10 @@ def main():
         traceback.print_exc()
 
     # we've left the game loop so now close everything down
-    disable_profiling(profiler)
-    dump_profiling_data(profiler)
+    persistence.wait_for_saves()
+    demography.shutdown_workers()
+    disable_profiling()
+    export_frame_timings()
     disable_logging()
 
     # clean up pygame resources
@@ -47,29 +58,41 @@ def game_loop():
     """
     The core game loop, handling input, rendering and logic.
     """
-    ui.swap_to_main_menu_screen()
+    with debug.trace_startup("main menu"):
+        ui.swap_to_main_menu_screen()
 
     while not state.get_current() == EXIT:
+        debug.start_frame()
+
+        # tick, once per frame
+        state.update_clock()
 
         # get info to support UI updates and handling events
         delta_time = state.get_delta_time()
+        debug.mark_phase("tick")
 
         # process any deletions from last frame
         world.process_pending_deletions()
+        debug.mark_phase("deletions")
+
+        # get input events. If nothing is changing we sleep until something does.
+        events = state.get_events(ui.get_idle_timeout())
+        debug.mark_phase("idle")
 
         # update based on input events
-        for event in pygame.event.get():
+        for event in events:
             ui.process_ui_event(event)
             processors.process_input(event)
+        debug.mark_phase("events")
 
         # allow the ui to respond to the progression of time
         ui.update(delta_time)
-
-        # tick
-        state.update_clock()
+        debug.mark_phase("update")
 
         # show the new state_data
         ui.draw()
+        debug.mark_phase("draw")
+        debug.trace_first_frame()
 
 
 if __name__ == "__main__":  # prevents being run from other modules
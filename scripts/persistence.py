@@ -0,0 +1,377 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import threading
+from typing import TYPE_CHECKING
+
+from scripts.components import EmbeddedPayload
+from scripts.constants import AUTOSAVE_KEEP_RECENT, AUTOSAVE_KEEP_SEASONS, JOURNAL_EXTENSION, SAVE_CATALOG_FILENAME, \
+    SAVE_EXTENSION, SAVE_PATH
+from scripts.stores.state_data import state_data
+
+if TYPE_CHECKING:
+    from typing import Union, Optional, Any, Tuple, Dict, List, Callable
+
+
+logger = logging.getLogger(__name__)
+
+
+# ways a queued file write can change a file
+REPLACE = "replace"  # overwrite with a single json document
+REPLACE_LINES = "replace_lines"  # overwrite with one json document per line
+APPEND_LINES = "append_lines"  # add one json document per line to the end
+DELETE = "delete"
+PRUNE_AUTOSAVES = "prune_autosaves"  # apply the autosave retention policy to a kingdom's dated autosaves
+UPDATE_CATALOG = "update_catalog"  # add, replace or remove save headers in the catalog
+RECONCILE_CATALOG = "reconcile_catalog"  # check the catalog against the saves in the save folder
+
+
+class FileWrite:
+    """
+    A pending change to a file in the save folder. Data is held as plain python objects and only encoded once the
+    background thread picks it up.
+    """
+    def __init__(self, path: str, mode: str, payloads: List[Any]):
+        self.path = path
+        self.mode = mode
+        self.payloads = payloads
+
+
+################################ GET - RETURN AN EXISTING SOMETHING ###############################
+
+def read_catalog() -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    Read the header of every save from the catalog, keyed by filename. Returns None if there is no catalog.
+    """
+    try:
+        with open(SAVE_PATH + SAVE_CATALOG_FILENAME, "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+    except json.JSONDecodeError:
+        logger.warning("Save catalog is corrupt. Ignoring it.")
+        return None
+
+
+def get_save_filenames() -> List[str]:
+    """
+    Get the filename of every save in the save folder, without the extension. Scans the folder rather than reading the
+    catalog.
+    """
+    filenames = []
+    for filename in os.listdir(SAVE_PATH):
+        if filename.endswith(SAVE_EXTENSION) and filename != SAVE_CATALOG_FILENAME:
+            filenames.append(filename[:-len(SAVE_EXTENSION)])
+
+    return filenames
+
+
+def get_autosaves_to_prune(dates: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+    """
+    Get the dates of the autosaves that fall outside the retention policy. Dates are (year, season, day). Keeps the
+    AUTOSAVE_KEEP_RECENT most recent, plus the first of each of the AUTOSAVE_KEEP_SEASONS most recent seasons.
+    """
+    ordered_dates = sorted(set(dates))
+    kept = set(ordered_dates[-AUTOSAVE_KEEP_RECENT:])
+
+    first_in_season: Dict[Tuple[int, int], Tuple[int, int, int]] = {}
+    for date in ordered_dates:
+        first_in_season.setdefault((date[0], date[1]), date)
+    seasons = sorted(first_in_season)
+    kept.update(first_in_season[season] for season in seasons[-AUTOSAVE_KEEP_SEASONS:])
+
+    return [date for date in ordered_dates if date not in kept]
+
+
+############################ CHECKS ##############################
+
+def is_saving() -> bool:
+    """
+    Check if there are any writes either waiting for or being processed by the background thread.
+    """
+    with state_data.save_condition:
+        return bool(state_data.pending_writes) or state_data.is_writing
+
+
+################################ ACTIONS - CHANGE STATE - RETURN NOTHING ###############################
+
+def queue_replace(path: str, data: Any):
+    """
+    Replace the file at path with data, as json, in the background.
+    """
+    _queue(FileWrite(path, REPLACE, [data]))
+
+
+def queue_append_line(path: str, data: Any):
+    """
+    Add data to the end of the file at path, as a single line of json, in the background.
+    """
+    _queue(FileWrite(path, APPEND_LINES, [data]))
+
+
+def queue_delete(path: str):
+    """
+    Delete the file at path, if it exists, in the background.
+    """
+    _queue(FileWrite(path, DELETE, []))
+
+
+def queue_prune_autosaves(name: str):
+    """
+    Delete the kingdom's dated autosaves that fall outside the retention policy, in the background. Name is as used in
+    the save's filename.
+    """
+    _queue(FileWrite(f"{SAVE_PATH}autosave_{name}_*", PRUNE_AUTOSAVES, [name]))
+
+
+def queue_catalog_update(filename: str, header: Dict[str, Any]):
+    """
+    Record a save's header in the catalog, in the background. The file size is added once the save has been written.
+    """
+    _queue(FileWrite(SAVE_PATH + SAVE_CATALOG_FILENAME, UPDATE_CATALOG, [(filename, header)]))
+
+
+def queue_catalog_reconcile(read_header: Callable[[str], Dict[str, Any]]):
+    """
+    Check the catalog against the saves in the save folder, in the background, dropping saves that have gone and
+    adding any it doesnt know, e.g. saves deleted or copied in by hand. Creates the catalog if it is missing.
+    read_header gets a save's header from the save itself, given its filename, and is called on the background thread.
+    """
+    # queued under the saves it reads, rather than the catalog, so it is never combined with a catalog update
+    _queue(FileWrite(f"{SAVE_PATH}*{SAVE_EXTENSION}", RECONCILE_CATALOG, [read_header]))
+
+
+def wait_for_saves():
+    """
+    Block until every queued write has been completed.
+    """
+    with state_data.save_condition:
+        while state_data.pending_writes or state_data.is_writing:
+            state_data.save_condition.wait()
+
+
+def _queue(file_write: FileWrite):
+    """
+    Hand a write to the background thread. If a write to the same file is still waiting it is combined with this one,
+    so a slow disk means fewer, larger writes rather than a growing queue. The combined write moves to the back of
+    the queue, so it still runs after everything queued before this one, e.g. a journal deleted after its base is
+    written, or a catalog update measuring a file after the appends before it.
+    """
+    with state_data.save_condition:
+        pending = state_data.pending_writes.pop(file_write.path, None)
+
+        if pending is None:
+            state_data.pending_writes[file_write.path] = file_write
+
+        # newer lines follow on from whatever is waiting
+        elif file_write.mode == APPEND_LINES:
+            if pending.mode == DELETE:
+                pending.mode = REPLACE_LINES
+            pending.payloads.extend(file_write.payloads)
+            state_data.pending_writes[file_write.path] = pending
+
+        # catalog updates are applied in order, so can be gathered up
+        elif file_write.mode == UPDATE_CATALOG and pending.mode == UPDATE_CATALOG:
+            pending.payloads.extend(file_write.payloads)
+            state_data.pending_writes[file_write.path] = pending
+
+        # anything else supersedes what is waiting
+        else:
+            state_data.pending_writes[file_write.path] = file_write
+
+        _start_save_thread()
+        state_data.save_condition.notify_all()
+
+
+def _start_save_thread():
+    """
+    Start the background thread, if it isnt already running. Must be called while holding the save condition.
+    """
+    if state_data.save_thread is None or not state_data.save_thread.is_alive():
+        state_data.save_thread = threading.Thread(target=_process_writes, name="save_writer", daemon=True)
+        state_data.save_thread.start()
+
+
+def _process_writes():
+    """
+    Take queued writes, in the order they were queued, and carry them out. Runs on the background thread.
+    """
+    condition = state_data.save_condition
+
+    while True:
+        with condition:
+            while not state_data.pending_writes:
+                condition.wait()
+
+            path = next(iter(state_data.pending_writes))
+            file_write = state_data.pending_writes.pop(path)
+            state_data.is_writing = True
+
+        try:
+            _write(file_write)
+        except Exception:
+            logger.exception("Failed to %s %s.", file_write.mode, file_write.path)
+
+        with condition:
+            state_data.is_writing = False
+            condition.notify_all()
+
+
+def _write(file_write: FileWrite):
+    """
+    Carry out a single write. Replacements go to a temporary file first and are then swapped in, so a crash mid-write
+    never leaves a half written save.
+    """
+    path = file_write.path
+    mode = file_write.mode
+
+    if mode == DELETE:
+        if os.path.exists(path):
+            os.remove(path)
+
+    elif mode == PRUNE_AUTOSAVES:
+        _prune_autosaves(file_write.payloads[0])
+
+    elif mode == UPDATE_CATALOG:
+        _update_catalog(file_write.payloads)
+
+    elif mode == RECONCILE_CATALOG:
+        _reconcile_catalog(file_write.payloads[0])
+
+    elif mode == APPEND_LINES:
+        text = "".join(_encode(payload) + "\n" for payload in file_write.payloads)
+        with open(path, "a") as file:
+            file.write(text)
+
+    else:
+        if mode == REPLACE:
+            text = _encode(file_write.payloads[0], indent=4)
+        else:
+            text = "".join(_encode(payload) + "\n" for payload in file_write.payloads)
+
+        _replace_file(path, text)
+
+
+def _encode(data: Any, indent: Optional[int] = None) -> str:
+    """
+    Encode data as json. Any EmbeddedPayload is encoded separately and stored as a string.
+    """
+    return json.dumps(data, indent=indent, default=_encode_embedded_payload)
+
+
+def _encode_embedded_payload(payload: Any) -> str:
+    """
+    Encode an EmbeddedPayload as a json string, for json.dumps to store as a string in turn.
+    """
+    if isinstance(payload, EmbeddedPayload):
+        return json.dumps(payload.data)
+    raise TypeError(f"Object of type {payload.__class__.__name__} is not JSON serializable")
+
+
+def _replace_file(path: str, text: str):
+    """
+    Write text to a temporary file and then swap it in for the file at path.
+    """
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as file:
+        file.write(text)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+def _prune_autosaves(name: str):
+    """
+    Delete the kingdom's dated autosaves, and any journals alongside them, that fall outside the retention policy.
+    """
+    pattern = re.compile(rf"autosave_{re.escape(name)}_(\d+)_(\d+)_(\d+){re.escape(SAVE_EXTENSION)}")
+
+    autosaves: Dict[Tuple[int, int, int], str] = {}
+    for filename in os.listdir(SAVE_PATH):
+        match = pattern.fullmatch(filename)
+        if match:
+            year, season, day = (int(group) for group in match.groups())
+            autosaves[(year, season, day)] = filename[:-len(SAVE_EXTENSION)]
+
+    pruned = []
+    for date in get_autosaves_to_prune(list(autosaves)):
+        for extension in (SAVE_EXTENSION, JOURNAL_EXTENSION):
+            path = SAVE_PATH + autosaves[date] + extension
+            if os.path.exists(path):
+                os.remove(path)
+        pruned.append((autosaves[date], None))
+
+    if pruned:
+        _update_catalog(pruned)
+
+    logger.debug("Pruned autosaves for %s.", name)
+
+
+def _update_catalog(updates: List[Tuple[str, Optional[Dict[str, Any]]]]):
+    """
+    Apply headers, keyed by filename, to the catalog. A header of None removes the save from the catalog. If there is
+    no catalog a new one is started; any other saves are added back when the catalog is next reconciled.
+    """
+    catalog = read_catalog()
+    if catalog is None:
+        logger.info("Save catalog not found. Starting a new one.")
+        catalog = {}
+
+    for filename, header in updates:
+        if header is None:
+            catalog.pop(filename, None)
+        else:
+            catalog[filename] = dict(header, file_size=_get_file_size(filename))
+
+    _replace_file(SAVE_PATH + SAVE_CATALOG_FILENAME, json.dumps(catalog, indent=4))
+
+
+def _reconcile_catalog(read_header: Callable[[str], Dict[str, Any]]):
+    """
+    Drop saves that have gone from the catalog and add those it doesnt know, reading their headers with read_header.
+    If there is no catalog it is rebuilt from the saves themselves.
+    """
+    catalog = read_catalog()
+    is_changed = catalog is None
+    if catalog is None:
+        logger.info("Save catalog not found. Rebuilding it from the save files.")
+        catalog = {}
+
+    filenames = get_save_filenames()
+
+    for filename in set(catalog).difference(filenames):
+        del catalog[filename]
+        is_changed = True
+
+    for filename in filenames:
+        # catalogs from before file sizes were recorded only need the size adding
+        if filename in catalog:
+            if "file_size" not in catalog[filename]:
+                catalog[filename]["file_size"] = _get_file_size(filename)
+                is_changed = True
+            continue
+
+        try:
+            catalog[filename] = dict(read_header(filename), file_size=_get_file_size(filename))
+            is_changed = True
+        except (KeyError, ValueError, OSError):
+            logger.warning("Couldn't read %s when updating the save catalog. Skipped it.", filename)
+
+    if is_changed:
+        _replace_file(SAVE_PATH + SAVE_CATALOG_FILENAME, json.dumps(catalog, indent=4))
+
+
+def _get_file_size(filename: str) -> int:
+    """
+    Get the size of a save on disk, in bytes, including any journal.
+    """
+    file_size = 0
+    for extension in (SAVE_EXTENSION, JOURNAL_EXTENSION):
+        path = SAVE_PATH + filename + extension
+        if os.path.exists(path):
+            file_size += os.path.getsize(path)
+
+    return file_size
@@ -1,61 +1,68 @@
 from __future__ import annotations
 
-import random
 from typing import TYPE_CHECKING, Type
 
-import pygame
-
-from scripts import state, ui, world
-from scripts.components import Demographic, Hourglass, Population
-from scripts.constants import DAYS_IN_YEAR, MINUTES_IN_DAY
+from scripts import debug, demography, state, world
+from scripts.components import Hourglass, Population
+from scripts.constants import CHECK_WORLD_INDEXES, MINUTES_IN_DAY
 
 if TYPE_CHECKING:
     from typing import Union, Optional, Any, Tuple, Dict, List
+    import pygame
 
 
 def process_input(event: pygame.event.Event):
+    # imported here so the simulation can run without pygame or the display
+    import pygame
+    from scripts import ui
+
     if event.type == pygame.KEYDOWN:
         if event.key == pygame.K_ESCAPE:
             ui.swap_to_main_menu_screen()
+        elif event.key == pygame.K_F3:
+            debug.toggle_frame_overlay()
+        elif event.key == pygame.K_F9:
+            debug.toggle_hotkey_profiling()
 
 def process_end_of_day():
     """
     Handle the transition of time.
     """
-    # births and deaths
-    for kingdom, (population, ) in world.get_components([Population]):
-        for demographic in population:
-            accrued_births = demographic.accrued_births
-            accrued_deaths = demographic.accrued_deaths
-
-            accrued_births += demographic.birth_rate_in_year / DAYS_IN_YEAR
-            accrued_deaths += demographic.amount / (demographic.lifespan * DAYS_IN_YEAR)
+    fast_forward(1)
 
-            # handle births
-            if accrued_births >= 1:
-                births = int(accrued_births)
-                accrued_births -= births
 
-                # add births
-                demographic.amount += births * random.randint(demographic.min_brood, demographic.max_brood)
-                demographic.accrued_births = accrued_births
-
-            # handle deaths of old age
-            if accrued_deaths >= 1:
-                deaths = int(accrued_deaths)
-                accrued_deaths -= deaths
+@debug.profile_region("fast_forward")
+def fast_forward(days: int):
+    """
+    Move time forwards by a number of days in a single pass. Births, deaths and the calendar all advance together and
+    the game is saved once at the end, rather than once per day.
+    """
+    if days < 1:
+        return
 
-                # remove deaths
-                demographic.amount -= deaths
-                demographic.accrued_deaths = accrued_deaths
+    # births and deaths
+    populations = [(kingdom, population) for kingdom, (population, ) in world.get_components([Population])]
+    demography.process_births_and_deaths(populations, world.get_seed(), world.get_days_passed(), days)
 
     # allocate available time
     player_kingdom = world.get_player_kingdom()
     hourglass = world.get_entitys_component(player_kingdom, Hourglass)
     hourglass.minutes_available = MINUTES_IN_DAY
+    world.mark_dirty(player_kingdom, Hourglass, ("minutes_available", ))
 
     # manage movement of time
-    world.pass_days(1)
+    world.pass_days(days)
+
+    if CHECK_WORLD_INDEXES:
+        debug.check_world_indexes()
 
     # save the game
     state.save_game(is_auto_save=True)
+
+
+def simulate_until(day: int, season: int, year: int):
+    """
+    Move time forwards until the given date, as shown by world.get_current_date. Does nothing if the date has passed.
+    """
+    target_days_passed = world.get_days_passed_on_date(day, season, year)
+    fast_forward(target_days_passed - world.get_days_passed())
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import random
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from typing import Union, Optional, Any, Tuple, Dict, List
+    import numpy
+
+
+# Random numbers are counter based: each is a hash of the world seed, what it is for (the stream), the entity, the day
+# and which draw it is. Nothing carries over from one draw to the next, so results never depend on the order things
+# are processed in, or on whether they are processed one at a time, in batches or across processes.
+
+# streams, one per use of random numbers, so different uses never see the same values
+BROOD_STREAM = 1
+
+_MASK = 0xFFFFFFFFFFFFFFFF  # keep python ints to 64 bits, to match numpy's uint64
+_GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+_MIX_MULTIPLIER_1 = 0xBF58476D1CE4E5B9
+_MIX_MULTIPLIER_2 = 0x94D049BB133111EB
+
+
+################################ CREATE - INIT OBJECT - RETURN NEW OBJECT ###############################
+
+def create_seed() -> int:
+    """
+    Create a new world seed.
+    """
+    return random.SystemRandom().getrandbits(63)
+
+
+############################# GET - RETURN AN EXISTING SOMETHING ###########################
+
+def randint(seed: int, stream: int, entity: int, day: int, draw: int, low: int, high: int) -> int:
+    """
+    Get a random integer between low and high, inclusive. The same arguments always give the same result.
+    """
+    value = _mix(seed & _MASK)
+    for key in (stream, entity, day, draw):
+        value = _mix(value ^ ((key * _GOLDEN_GAMMA) & _MASK))
+
+    return low + value % (high - low + 1)
+
+
+def randints(seed: int, stream: int, entities: numpy.ndarray, day: int, draws: numpy.ndarray, lows: numpy.ndarray,
+        highs: numpy.ndarray) -> numpy.ndarray:
+    """
+    Get a batch of random integers, one per row of the arrays, between lows and highs, inclusive. Matches calling
+    randint for each row in turn.
+    """
+    import numpy as np
+
+    count = len(entities)
+    gamma = np.uint64(_GOLDEN_GAMMA)
+    value = np.full(count, _mix(seed & _MASK), np.uint64)
+    keys = (np.full(count, stream, np.uint64), entities.astype(np.uint64), np.full(count, day, np.uint64),
+            draws.astype(np.uint64))
+    for key in keys:
+        # array multiplication wraps silently, as it does for python ints masked to 64 bits
+        value = _mix_array(np, value ^ (key * gamma))
+
+    spans = (highs - lows + 1).astype(np.uint64)
+    return lows + (value % spans).astype(np.int64)
+
+
+def _mix(value: int) -> int:
+    """
+    Scramble a 64 bit value, so nearby inputs give unrelated outputs. The SplitMix64 finaliser.
+    """
+    value = ((value ^ (value >> 30)) * _MIX_MULTIPLIER_1) & _MASK
+    value = ((value ^ (value >> 27)) * _MIX_MULTIPLIER_2) & _MASK
+    return value ^ (value >> 31)
+
+
+def _mix_array(np: Any, values: numpy.ndarray) -> numpy.ndarray:
+    """
+    Scramble an array of 64 bit values. Matches _mix.
+    """
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(_MIX_MULTIPLIER_1)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(_MIX_MULTIPLIER_2)
+    return values ^ (values >> np.uint64(31))
@@ -2,15 +2,21 @@ from __future__ import annotations
 
 import json
 import logging
+import os
 from typing import TYPE_CHECKING
 
-from scripts import world
-from scripts.constants import GAME_FPS, SAVE_PATH
+from snecs.ecs import SERIALIZED_COMPONENTS_KEY, SERIALIZED_ENTITIES_KEY
+
+from scripts import debug, persistence, rng, world
+from scripts.components import Details, IsPlayerControlled, Population
+from scripts.constants import AUTOSAVE_BASE_INTERVAL, FRAME_CAPS, GAME_FPS, JOURNAL_EXTENSION, SAVE_EXTENSION, \
+    SAVE_FORMAT_VERSION, SAVE_PATH
 from scripts.stores.state_data import state_data
 from scripts.stores.world_data import world_data
 
 if TYPE_CHECKING:
     from typing import Union, Optional, Any, Tuple, Dict, List
+    import pygame
 
 
 def get_previous() -> int:
@@ -20,18 +26,46 @@ def get_previous() -> int:
     return state_data.previous_game_state
 
 
-def get_internal_clock():
+def get_internal_clock() -> pygame.time.Clock:
     """
-    Get the internal clock
+    Get the internal clock, creating it on first use
     """
+    if state_data.internal_clock is None:
+        import pygame
+        state_data.internal_clock = pygame.time.Clock()
+
     return state_data.internal_clock
 
 
 def get_delta_time() -> float:
     """
-    get delta time and set frame rate with .tick()
+    Get the time, in seconds, between the last two ticks of the internal clock.
+    """
+    return state_data.delta_time
+
+
+def get_frame_cap() -> int:
+    """
+    Get the most frames per second allowed in the current game state.
     """
-    return state_data.internal_clock.tick(GAME_FPS) / 1000.0
+    return FRAME_CAPS.get(state_data.current_game_state, GAME_FPS)
+
+
+def get_events(idle_timeout: Optional[int]) -> List[pygame.event.Event]:
+    """
+    Get the events waiting to be processed. If there are none and an idle timeout, in ms, is given, block until one
+    arrives or the timeout passes, so no work is done while nothing is happening.
+    """
+    import pygame
+
+    events = pygame.event.get()
+
+    if idle_timeout is not None and not events:
+        event = pygame.event.wait(idle_timeout)
+        if event.type != pygame.NOEVENT:
+            events = [event] + pygame.event.get()
+
+    return events
 
 
 def get_current() -> int:
@@ -43,10 +77,10 @@ def get_current() -> int:
 
 def update_clock():
     """
-    Tick the internal clock. Manages the frame rate.
+    Tick the internal clock, once per frame. Manages the frame rate and records the delta time.
     """
     # set frame rate
-    state_data.internal_clock.tick(GAME_FPS)
+    state_data.delta_time = get_internal_clock().tick(get_frame_cap()) / 1000.0
 
 
 def set_new(new_game_state: int):
@@ -62,46 +96,221 @@ def set_new(new_game_state: int):
     logging.info(log_string)
 
 
-def save_game(is_auto_save: bool = False):
-    """
-    Serialise the game data to a file
+@debug.profile_region("save_game")
+def save_game(is_auto_save: bool = False) -> str:
     """
-    # get the info needed
-    save = {}
-    save["days_passed"] = world_data.days_passed
-    save["world"] = world.serialise()
+    Serialise the game data to a file. Returns the filename, without the path to the save folder. The world is
+    snapshot immediately but written to file in the background, see persistence.is_saving.
 
-    # get date for filename
-    date = world.get_current_date()
+    Autosaves go to a single file per kingdom. A full save is written every AUTOSAVE_BASE_INTERVAL days and in between
+    only the changes are appended to a journal alongside it. Each full autosave is also kept as a dated copy, of
+    which only the most recent and the first of each recent season are retained.
+    """
+    # get the name for the filename
     player_kingdom = world.get_player_kingdom()
     name = world.get_name(player_kingdom)
     name = name.replace(" ", "_")  # clean name
-    filename = f"{name}_{date[2]}_{date[1]}_{date[0]}"
+    date = world.get_current_date()
+    header = _get_save_header()
 
-    # if is autosave add prefix
+    # autosaves only record what has changed, unless a full save is due
     if is_auto_save:
-        filename = "autosave_" + filename
+        filename = "autosave_" + name
 
-        # TODO - clear old autosaves
+        if is_autosave_base_due(filename):
+            # keep a dated copy to go back to, and prune those no longer needed
+            dated_filename = f"{filename}_{date[2]}_{date[1]}_{date[0]}"
+            _queue_full_save([filename, dated_filename])
+            persistence.queue_delete(SAVE_PATH + filename + JOURNAL_EXTENSION)
+            persistence.queue_catalog_update(dated_filename, header)
+            persistence.queue_prune_autosaves(name)
 
-    # write to json
-    with open(SAVE_PATH + filename + ".json", "w") as file:
-        json.dump(save, file, indent=4)
+            state_data.autosave_base_filename = filename
+            state_data.autosave_base_days_passed = world_data.days_passed
+        else:
+            persistence.queue_append_line(SAVE_PATH + filename + JOURNAL_EXTENSION, world.serialise_changes())
 
+        world.clear_changes()
 
+    else:
+        filename = f"{name}_{date[2]}_{date[1]}_{date[0]}"
+        _queue_full_save([filename])
+
+    persistence.queue_catalog_update(filename, header)
+
+    return filename
+
+
+@debug.profile_region("load_game")
 def load_game(filename: str):
     """
-    Deserialise the game data from a file. Filename does not include path to save folder.
+    Deserialise the game data from a file. Filename does not include path to save folder. Any changes recorded in a
+    journal alongside the save are applied on top.
     """
-    # read from json
-    with open(SAVE_PATH + filename + ".json", "r") as file:
-        save = json.load(file)
+    save, base_days_passed = _read_save(filename)
 
     # deserialise data
     world.set_days_passed(save["days_passed"])
+    if "seed" in save:
+        world.set_seed(save["seed"])
+    else:
+        # saves from before seeds were kept carry on with a new one
+        world.set_seed(rng.create_seed())
+        logging.info(f"{filename} has no seed. Using a new one.")
     new_world = world.deserialise(save["world"])
 
     # set the data as the default world
     world.move_world(new_world)
 
+    # the loaded world is now what is saved, so further autosaves can build on it
+    world.clear_changes()
+    state_data.autosave_base_filename = filename
+    state_data.autosave_base_days_passed = base_days_passed
+
+
+def get_save_catalog() -> Dict[str, Dict[str, Any]]:
+    """
+    Get the header of every save, keyed by filename. Only reads the catalog, which is checked against the save folder
+    once at startup, see reconcile_save_catalog, and kept up to date by each save after that.
+    """
+    return persistence.read_catalog() or {}
+
+
+def reconcile_save_catalog():
+    """
+    Check the catalog against the saves in the save folder, in the background, e.g. for saves deleted or copied in by
+    hand. Rebuilds the catalog from the saves themselves if it is missing.
+    """
+    persistence.queue_catalog_reconcile(_read_save_header)
+
+
+def is_autosave_base_due(filename: str) -> bool:
+    """
+    Check if an autosave needs to be a full save, rather than only recording changes.
+    """
+    if state_data.autosave_base_filename != filename:
+        return True
+
+    return world_data.days_passed - state_data.autosave_base_days_passed >= AUTOSAVE_BASE_INTERVAL
+
+
+def _queue_full_save(filenames: List[str]):
+    """
+    Snapshot the whole world and queue it to be written to each of the save files.
+    """
+    # get the info needed
+    save = {}
+    save["format_version"] = SAVE_FORMAT_VERSION
+    save["days_passed"] = world_data.days_passed
+    save["seed"] = world_data.seed
+    save["world"] = world.serialise()
+
+    for filename in filenames:
+        persistence.queue_replace(SAVE_PATH + filename + SAVE_EXTENSION, save)
+
+
+def _read_save(filename: str) -> Tuple[Dict[str, Any], int]:
+    """
+    Read a save file and replay any journal alongside it. Returns the save and the days passed when the full save was
+    written.
+    """
+    # make sure we read what was last saved
+    persistence.wait_for_saves()
+
+    return _read_save_files(filename)
+
+
+def _read_save_files(filename: str) -> Tuple[Dict[str, Any], int]:
+    """
+    Read a save file and replay any journal alongside it. Unlike _read_save, doesnt wait for queued writes. Returns
+    the save and the days passed when the full save was written.
+    """
+    # read from json
+    with open(SAVE_PATH + filename + SAVE_EXTENSION, "r") as file:
+        save = json.load(file)
+    base_days_passed = save["days_passed"]
+
+    # replay changes made since the full save
+    journal_path = SAVE_PATH + filename + JOURNAL_EXTENSION
+    if os.path.exists(journal_path):
+        with open(journal_path, "r") as file:
+            for line in file:
+                try:
+                    changes = json.loads(line)
+                except json.JSONDecodeError:
+                    logging.warning(f"Ignored incomplete line in {filename} journal. Was the game closed mid-save?")
+                    break
+
+                # skip anything left over from before the full save
+                if changes["days_passed"] <= base_days_passed:
+                    continue
+
+                world.merge_changes(save["world"], changes)
+                save["days_passed"] = changes["days_passed"]
+
+    return save, base_days_passed
+
+
+def _get_save_header() -> Dict[str, Any]:
+    """
+    Get the summary of the current game shown when choosing a save to load.
+    """
+    player_kingdom = world.get_player_kingdom()
+
+    population = 0
+    if world.has_component(player_kingdom, Population):
+        population = sum(demographic.amount for demographic in world.get_entitys_component(player_kingdom, Population))
+
+    header = {
+        "kingdom_name": world.get_name(player_kingdom),
+        "date": list(world.get_current_date()),
+        "days_passed": world_data.days_passed,
+        "population": population,
+        "format_version": SAVE_FORMAT_VERSION
+    }
+
+    return header
+
+
+def _read_save_header(filename: str) -> Dict[str, Any]:
+    """
+    Get the summary shown when choosing a save to load from the save itself. Called on the background save thread, so
+    doesnt wait for queued writes.
+    """
+    save, base_days_passed = _read_save_files(filename)
+    return _get_save_header_from_save(save)
+
+
+def _get_save_header_from_save(save: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Get the summary shown when choosing a save to load from the contents of the save itself.
+    """
+    serialised_world = save["world"]
+    component_names = serialised_world[SERIALIZED_COMPONENTS_KEY]
+
+    # find the player's kingdom
+    player_index = str(component_names.index(IsPlayerControlled.__name__))
+    for serialised_components in serialised_world[SERIALIZED_ENTITIES_KEY].values():
+        if player_index in serialised_components:
+            break
+    else:
+        raise ValueError("No player kingdom in save.")
+
+    details = Details.deserialize(serialised_components[str(component_names.index(Details.__name__))])
+
+    population = 0
+    if Population.__name__ in component_names:
+        population_index = str(component_names.index(Population.__name__))
+        if population_index in serialised_components:
+            population = sum(demographic.amount for demographic in
+                             Population.deserialize(serialised_components[population_index]))
+
+    header = {
+        "kingdom_name": details.kingdom_name,
+        "date": list(world.get_date(save["days_passed"])),
+        "days_passed": save["days_passed"],
+        "population": population,
+        "format_version": save.get("format_version", 0)
+    }
 
+    return header
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, Type
+
+from scripts.constants import FRAME_TIMING_SIZE, PROFILING_OFF
+
+if TYPE_CHECKING:
+    from typing import Union, Optional, Any, Tuple, Dict, List
+    import cProfile
+    import pstats
+    import pygame
+    from logging.handlers import QueueListener
+
+
+class _DebugDataStore:
+    """
+    Hold the state of the debugging tools, such as profiling
+    """
+    def __init__(self):
+        # startup
+        self.started_at: float = time.perf_counter()
+        self.is_first_frame_traced: bool = False
+
+        # writes queued log records to file, see debug.initialise_logging
+        self.log_listener: Optional[QueueListener] = None
+
+        self.profiling_mode: str = PROFILING_OFF
+
+        # sampling. Counts of how often each collapsed stack was seen.
+        self.samples: Counter = Counter()
+        self.sampler_thread: Optional[threading.Thread] = None
+        self.is_sampling: bool = False
+
+        # deterministic profiling, either of marked regions, by name, or toggled by hotkey
+        self.region_stats: Dict[str, pstats.Stats] = {}
+        self.is_profiling_region: bool = False
+        self.hotkey_profiler: Optional[cProfile.Profile] = None
+
+        # frame timing. A ring buffer of seconds spent in each phase of the game loop, per frame.
+        self.phase_times: Dict[str, List[float]] = {}
+        self.over_budget: List[bool] = [False] * FRAME_TIMING_SIZE
+        self.frame_index: int = -1  # slot in the ring buffer of the current frame
+        self.frames_recorded: int = 0
+        self.phase_start: float = 0.0
+        self.is_frame_overlay_shown: bool = False
+        self.overlay_font: Optional[pygame.font.Font] = None
+
+        logging.info(f"_DebugDataStore initialised.")
+
+
+debug_data = _DebugDataStore()
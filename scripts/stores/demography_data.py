@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import logging
+from typing import TYPE_CHECKING, Type
+
+from scripts.constants import DEMOGRAPHY_WORKERS
+
+if TYPE_CHECKING:
+    from typing import Union, Optional, Any, Tuple, Dict, List
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing.shared_memory import SharedMemory
+    from snecs.typedefs import EntityID
+    from scripts.components import Population
+    from scripts.demography import DemographicColumns
+
+
+class _DemographyDataStore:
+    """
+    Hold the worker processes that births and deaths are sharded across, the memory they share and the demographic
+    columns kept between days.
+    """
+    def __init__(self):
+        self.worker_count: Optional[int] = DEMOGRAPHY_WORKERS  # None for one per core
+
+        # started on first use and kept, see demography.get_executor
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+        # the demographic columns, shared with the workers. Kept and reused while big enough.
+        self.shared_memory: Optional[SharedMemory] = None
+
+        # every demographic as columns, kept between days while the populations dont change, see
+        # demography.get_columns. In the shared memory if it is in use.
+        self.columns: Optional[DemographicColumns] = None
+        self.layout: List[Tuple[EntityID, Population, int]] = []  # entity, population and length the columns hold
+        self.revision: Optional[Tuple[int, ...]] = None  # the world's revision of populations the columns match
+
+        logging.info(f"_DemographyDataStore initialised.")
+
+
+demography_data = _DemographyDataStore()
@@ -1,21 +1,33 @@
 from __future__ import annotations
 
 import logging
+import threading
 from typing import TYPE_CHECKING, Type
 
-import pygame
-
 from scripts.constants import INITIALISING, GAME_FPS
 
 if TYPE_CHECKING:
     from typing import Union, Optional, Any, Tuple, Dict, List
+    import pygame
+    from scripts.persistence import FileWrite
 
 
 class _StateDataStore:
     def __init__(self):
         self.current_game_state = INITIALISING
         self.previous_game_state = INITIALISING
-        self.internal_clock = pygame.time.Clock()
+        self.internal_clock: Optional[pygame.time.Clock] = None  # created on first use, see state.get_internal_clock
+        self.delta_time: float = 0.0
+
+        # the full autosave that changes are currently being recorded against
+        self.autosave_base_filename: str = ""
+        self.autosave_base_days_passed: int = 0
+
+        # writes waiting for the background save thread, keyed by path
+        self.save_condition = threading.Condition()
+        self.pending_writes: Dict[str, FileWrite] = {}
+        self.is_writing: bool = False
+        self.save_thread: Optional[threading.Thread] = None
 
         logging.info(f"StateDataStore initialised.")
 
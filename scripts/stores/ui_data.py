@@ -1,14 +1,17 @@
 from __future__ import annotations
 
 import logging
+from collections import OrderedDict
 from typing import TYPE_CHECKING
-import pygame
-from pygame_gui import UIManager
 from scripts.constants import BASE_WINDOW_WIDTH, BASE_WINDOW_HEIGHT
-from scripts.ui_elements.screen import Screen
 
 if TYPE_CHECKING:
     from typing import Union, Optional, Any, Tuple, Dict, List
+    import pygame
+    from pygame_gui import UIManager
+    from scripts.ui_elements.screen import Screen
+    from pygame_gui.core import UIElement
+    from scripts.ui_elements.binding import Binding
 
 
 class _UIDataStore:
@@ -17,29 +20,37 @@ class _UIDataStore:
     """
 
     def __init__(self):
-        # first action needs to be to init pygame.
-        pygame.init()
-
-        #  set the display
+        #  set the display. The window, surface and pygame_gui are created by ui.initialise.
         self.desired_width = BASE_WINDOW_WIDTH
         self.desired_height = BASE_WINDOW_HEIGHT
         self._screen_scaling_mod_x = self.desired_width // BASE_WINDOW_WIDTH
         self._screen_scaling_mod_y = self.desired_height // BASE_WINDOW_HEIGHT
-        self.window: pygame.display = pygame.display.set_mode((self.desired_width, self.desired_height))
-        self.main_surface: pygame.Surface = pygame.Surface((BASE_WINDOW_WIDTH,
-                                                            BASE_WINDOW_HEIGHT), pygame.SRCALPHA)
+        self.window: Optional[pygame.Surface] = None
+        self.main_surface: Optional[pygame.Surface] = None
+        self.gui: Optional[UIManager] = None
 
         # hold ref to all current elements
         self.elements: Dict[str, Screen] = {}
         self.new_elements: Dict[str, Screen] = {}
         self.focused_element_name: str = ""
         self.element_keys_to_delete: List[Optional[str]] = []
+        self.event_routes: Dict[UIElement, Screen] = {}  # the screen handling each element's events
+
+        # screens kept after being left, so they can be shown again without rebuilding. Least recently used first.
+        self.screen_cache: OrderedDict[str, Screen] = OrderedDict()
+
+        # bindings whose components have changed since last frame. Dict used as an ordered set.
+        self.bindings_to_refresh: Dict[Binding, None] = {}
 
-        # now that the display is configured  init the pygame_gui
-        self.gui = UIManager((BASE_WINDOW_WIDTH, BASE_WINDOW_HEIGHT), "themes.json")
+        # what was last drawn, so we can draw only what changes
+        self.is_full_redraw_needed: bool = True
+        self.was_changed: bool = True  # if the last frame drew anything other than live elements
+        self.drawn_sprites: List[Tuple[pygame.Surface, Tuple[int, int, int, int]]] = []
 
-        # process config
-        pygame.display.set_caption("Kingdom Manager")
+        # visible elements that can redraw their image in place, found once per frame by ui.update, and those found
+        # the frame before, so an element's last change is drawn after it stops being live
+        self.live_elements: List[UIElement] = []
+        self.previous_live_elements: List[UIElement] = []
 
         logging.info(f"_UIDataStore initialised.")
 
@@ -3,8 +3,13 @@ from __future__ import annotations
 import logging
 from typing import TYPE_CHECKING, Type
 
+from scripts import rng
+
 if TYPE_CHECKING:
-    from typing import Union, Optional, Any, Tuple, Dict, List
+    from typing import Union, Optional, Any, Tuple, Dict, List, Set, Collection, Hashable, Callable
+    from snecs import Component
+    from scripts.catalog import Catalog
+    from snecs.typedefs import EntityID
 
 
 class _WorldDataStore:
@@ -12,59 +17,31 @@ class _WorldDataStore:
     Hold the world data
     """
     def __init__(self):
-        self.races: Dict[str, Dict[str, Union[int, str]]] = self._load_race_values()
-        self.lands: Dict[str, Dict[str, str]] = self._load_land_values()
+        # base data for races, lands etc., loaded from the data files on first use. See world.get_catalog.
+        self.catalogs: Dict[str, Catalog] = {}
 
         self.days_passed: int = 1
+        self.seed: int = rng.create_seed()  # all random draws derive from this, see rng.randint
 
-        logging.info(f"_WorldDataStore initialised.")
+        # changes since the last autosave
+        self.dirty_components: Dict[EntityID, Set[Type[Component]]] = {}
+        self.deleted_entities: Set[EntityID] = set()
 
-    ######################## LOAD VALUES ########################
+        # indexes into the world, see world.rebuild_indexes
+        self.flag_index: Dict[Type[Component], Set[EntityID]] = {}
+        self.entities_to_delete: Set[EntityID] = set()
+        self.secondary_indexes: Dict[str, Dict[Hashable, Set[EntityID]]] = {}
+        self.secondary_index_keys: Dict[str, Dict[EntityID, Collection[Hashable]]] = {}
+        self.are_secondary_indexes_stale: bool = True
 
-    def _load_race_values(self) -> Dict[str, Dict[str, Union[int, str]]]:
-        """
-        Set the initial race values
-        """
-        races = {
-            "goblin": {
-                "name": "Goblin",
-                "homeworld": "G'rorrn",
-                "amount": 100,
-                "birth_rate": 2,
-                "min_brood": 1,
-                "max_brood": 2,
-                "lifespan": 2
-            },
-            "shoom": {
-                "name": "Shoom",
-                "homeworld": "Ee Arth",
-                "amount": 20,
-                "birth_rate": 0.2,
-                "min_brood": 1,
-                "max_brood": 1,
-                "lifespan": 20
-            }
-        }
+        # counts of changes, so those showing the world can tell if it has moved on. See world.get_revision.
+        self.revision: int = 0  # whole world replaced or entities deleted
+        self.component_revisions: Dict[Type[Component], int] = {}
 
-        return races
+        # called when a component is marked dirty. See world.add_observer.
+        self.observers: Dict[Type[Component], List[Callable[[EntityID, Collection[str]], None]]] = {}
 
-    def _load_land_values(self) -> Dict[str, Dict[str, str]]:
-        """
-        Set the initial land values
-        """
-        lands = {
-            "black_moors": {
-                "name": "Black Moors",
-                "terrain": "grassland",
-                "size": "small"
-            },
-            "the_grove": {
-                "name": "The Grove",
-                "terrain": "woods",
-                "size": "medium"
-            }
-        }
-        return lands
+        logging.info(f"_WorldDataStore initialised.")
 
 
 world_data = _WorldDataStore()
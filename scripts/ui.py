@@ -1,23 +1,96 @@
 from __future__ import annotations
 
 import logging
-from typing import TYPE_CHECKING
+from itertools import chain
+from typing import TYPE_CHECKING, Type
 
 import pygame
 from pygame.rect import Rect
-from scripts.constants import BASE_WINDOW_HEIGHT, BASE_WINDOW_WIDTH
+from scripts import debug
+from scripts.constants import BASE_WINDOW_HEIGHT, BASE_WINDOW_WIDTH, IDLE_WAIT_TIMEOUT, SCREEN_CACHE_MAX_BYTES, \
+    USE_DIRTY_RECT_RENDERING, USE_SCREEN_CACHE
 from scripts.stores.ui_data import ui_data
-from scripts.ui_elements.main_menu import MainMenuScreen
 
 if TYPE_CHECKING:
-    pass
+    from typing import Union, Optional, Any, Tuple, Dict, List
+    from pygame_gui.core import UIElement
+    from scripts.ui_elements.binding import Binding
+    from scripts.ui_elements.screen import Screen
+
+
+logger = logging.getLogger(__name__)
+
+# pygame_gui's container interface, imported by initialise, as pygame_gui is slow to import
+_container_interface: Optional[Type] = None
 
 
 ######################## CORE FUNCTIONALITY - NEEDED TO RUN ###############################
 
+def initialise():
+    """
+    Start pygame, open the window and create the pygame_gui manager. Must be called before anything is shown.
+    """
+    # imported here as it is slow, and only needed once there is something to show
+    global _container_interface
+    with debug.trace_startup("import pygame_gui"):
+        from pygame_gui import UIManager
+        from pygame_gui.core.interfaces import IContainerLikeInterface
+    _container_interface = IContainerLikeInterface
+
+    with debug.trace_startup("pygame"):
+        pygame.init()
+
+    with debug.trace_startup("display"):
+        ui_data.window = pygame.display.set_mode((ui_data.desired_width, ui_data.desired_height))
+        ui_data.main_surface = pygame.Surface((BASE_WINDOW_WIDTH, BASE_WINDOW_HEIGHT), pygame.SRCALPHA)
+        pygame.display.set_caption("Kingdom Manager")
+
+    with debug.trace_startup("ui manager"):
+        ui_data.gui = UIManager((BASE_WINDOW_WIDTH, BASE_WINDOW_HEIGHT), "themes.json")
+
+
 def draw():
     """
-    Draw the UI.
+    Draw the UI. If dirty rect rendering is on only the areas that have changed are redrawn, and if nothing has
+    changed the frame is skipped entirely.
+    """
+    # the overlay changes every frame
+    if debug.is_frame_overlay_shown():
+        ui_data.is_full_redraw_needed = True
+
+    if not USE_DIRTY_RECT_RENDERING or ui_data.is_full_redraw_needed:
+        ui_data.was_changed = True
+        _draw_everything()
+        return
+
+    dirty_rects = _get_dirty_rects()
+
+    # nothing has changed so there is nothing to draw
+    if not dirty_rects:
+        return
+
+    # if scaling we cant easily map areas between surfaces, so give up on saving work
+    if (ui_data.desired_width, ui_data.desired_height) != (BASE_WINDOW_WIDTH, BASE_WINDOW_HEIGHT):
+        _draw_everything()
+        return
+
+    main_surface = ui_data.main_surface
+
+    # redraw only within the changed area
+    main_surface.set_clip(dirty_rects[0].unionall(dirty_rects[1:]))
+    main_surface.fill((0, 0, 0))
+    ui_data.gui.draw_ui(main_surface)
+    main_surface.set_clip(None)
+
+    # present only the changed areas
+    for rect in dirty_rects:
+        ui_data.window.blit(main_surface, rect, rect)
+    pygame.display.update(dirty_rects)
+
+
+def _draw_everything():
+    """
+    Draw the whole UI and present the whole frame.
     """
     main_surface = ui_data.main_surface
 
@@ -26,6 +99,9 @@ def draw():
 
     ui_data.gui.draw_ui(main_surface)
 
+    if debug.is_frame_overlay_shown():
+        debug.draw_frame_overlay(main_surface)
+
     # resize the surface to the desired resolution
     scaled_surface = pygame.transform.scale(main_surface, (ui_data.desired_width, ui_data.desired_height))
     ui_data.window.blit(scaled_surface, (0, 0))
@@ -33,6 +109,59 @@ def draw():
     # update the display
     pygame.display.flip()  # make sure to do this as the last drawing element in a frame
 
+    ui_data.is_full_redraw_needed = False
+    ui_data.drawn_sprites = _get_visible_sprites()
+
+
+def _get_dirty_rects() -> List[Rect]:
+    """
+    Get the areas of the screen where a ui sprite has appeared, disappeared, moved or had its image replaced since
+    the last draw, plus the areas of live elements, which can redraw their image in place. Records whether any
+    sprites changed, see get_idle_timeout.
+    """
+    visible_sprites = _get_visible_sprites()
+    drawn_sprites = ui_data.drawn_sprites
+
+    # anything in one but not the other has changed, and needs both its old and new area redrawn. Images are compared
+    # as objects, and are kept until the next draw, so a replaced image can never be mistaken for the one before it.
+    dirty_rects = []
+    if visible_sprites != drawn_sprites:
+        dirty_rects = [Rect(rect) for image, rect in set(visible_sprites).symmetric_difference(drawn_sprites)]
+        ui_data.drawn_sprites = visible_sprites
+    ui_data.was_changed = bool(dirty_rects)
+
+    live_elements = set(ui_data.live_elements).union(ui_data.previous_live_elements)
+    dirty_rects.extend(Rect(element.rect) for element in live_elements)
+
+    return dirty_rects
+
+
+def _get_visible_sprites() -> List[Tuple[pygame.Surface, Tuple[int, int, int, int]]]:
+    """
+    Get each visible ui sprite's image and the area it is drawn to.
+    """
+    return [(blit_data[0], tuple(blit_data[1])) for blit_data in ui_data.gui.ui_group.visible]
+
+
+def _get_live_elements() -> List[UIElement]:
+    """
+    Get the visible elements that can change their image without replacing it, so cant be seen to have changed. For
+    example, the blinking cursor of a focused text entry, the states of a hovered button and scrolling text.
+    """
+    focused_elements = ui_data.gui.get_focus_set() or ()
+
+    live_elements = []
+    for element in ui_data.gui.ui_group.sprites():
+        if not getattr(element, "visible", True):
+            continue
+
+        # containers, such as panels, look the same whether hovered or not
+        is_hovered = getattr(element, "hovered", False) and not isinstance(element, _container_interface)
+        if element in focused_elements or is_hovered or getattr(element, "active_text_effect", None) is not None:
+            live_elements.append(element)
+
+    return live_elements
+
 
 def process_ui_event(event: pygame.event.Event):
     """
@@ -40,37 +169,83 @@ def process_ui_event(event: pygame.event.Event):
     """
     ui_data.gui.process_events(event)
 
-    # make sure it is a pgui event
-    if event.type == pygame.USEREVENT:
-        elements = ui_data.elements
+    # the window's contents may have been lost. Other input, such as hovering, shows up as changed or live sprites.
+    if event.type in (pygame.VIDEORESIZE, pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED):
+        ui_data.is_full_redraw_needed = True
 
-        for element in elements.values():
-            element.handle_event(event)
+    # make sure it is a pgui event, then pass it to the screen that owns the element that raised it
+    if event.type == pygame.USEREVENT:
+        screen = ui_data.event_routes.get(getattr(event, "ui_element", None))
+        if screen is not None:
+            screen.handle_event(event)
 
 
 def update(delta_time: float):
     """
     Update all ui_data elements
     """
+    # apply component changes to bound elements, once each however many changes there were
+    if ui_data.bindings_to_refresh:
+        bindings = ui_data.bindings_to_refresh
+        ui_data.bindings_to_refresh = {}
+        for binding in bindings:
+            binding.refresh()
+
     ui_data.gui.update(delta_time)
 
     # delete all items
     if ui_data.element_keys_to_delete:
         for key in ui_data.element_keys_to_delete:
             element = ui_data.elements.pop(key)
-            element.kill()
-            logging.debug(f"Killed {key} element")
+
+            # cached screens are kept to be shown again
+            if _is_cached(key, element):
+                element.hide()
+                logger.debug("Hid %s element", key)
+            else:
+                element.kill()
+                logger.debug("Killed %s element", key)
         # clear list
         ui_data.element_keys_to_delete = []
+        ui_data.is_full_redraw_needed = True
 
     # copy newly created elements to the main element list
     if ui_data.new_elements:
         for key, value in ui_data.new_elements.items():
+            value.show()
             ui_data.elements[key] = value
-            logging.debug(f"Moved {key} from new_elements to elements.")
+            logger.debug("Moved %s from new_elements to elements.", key)
 
         # all copied, clear dict
         ui_data.new_elements = {}
+        ui_data.is_full_redraw_needed = True
+
+    # found once here for both drawing and checking if idle
+    ui_data.previous_live_elements = ui_data.live_elements
+    ui_data.live_elements = _get_live_elements()
+
+
+######################## CHECKS ###############################
+
+def get_idle_timeout() -> Optional[int]:
+    """
+    Get how long, in ms, the ui can wait for input before it has something new to show. None if it isnt idle, i.e.
+    the last frame changed something, something is waiting to be drawn or something is animating. The blinking cursor
+    of a focused text entry only needs a frame each time it blinks, so doesnt stop the ui from idling until then.
+    """
+    if not USE_DIRTY_RECT_RENDERING or ui_data.was_changed or ui_data.is_full_redraw_needed:
+        return None
+
+    if not ui_data.live_elements:
+        return IDLE_WAIT_TIMEOUT
+
+    # text entries blink their cursor every blink_cursor_time seconds. Anything else live animates every frame.
+    blink_times = [getattr(element, "blink_cursor_time", None) for element in ui_data.live_elements]
+    if None in blink_times or any(getattr(element, "hovered", False) for element in ui_data.live_elements):
+        return None
+
+    # the cursor only changes on the first update after its interval is up, so wake twice per interval
+    return min(int(min(blink_times) * 1000) // 2, IDLE_WAIT_TIMEOUT)
 
 
 ######################## ALTER - CHANGE EXISTING ELEMENTS ###############################
@@ -80,7 +255,28 @@ def set_focused_element(element_name: str):
     Set the element currently being used/interacted with
     """
     ui_data.focused_element_name = element_name
-    logging.debug(f"Set {element_name} as focused element.")
+    logger.debug("Set %s as focused element.", element_name)
+
+
+def add_event_route(element: UIElement, screen: Screen):
+    """
+    Send events raised by the element to the screen.
+    """
+    ui_data.event_routes[element] = screen
+
+
+def remove_event_route(element: UIElement):
+    """
+    Stop sending events raised by the element anywhere.
+    """
+    ui_data.event_routes.pop(element, None)
+
+
+def queue_binding_refresh(binding: Binding):
+    """
+    Refresh the binding's element next frame. Queuing the same binding more than once refreshes it once.
+    """
+    ui_data.bindings_to_refresh[binding] = None
 
 
 def delete_element_next_frame(element_name: str):
@@ -89,7 +285,7 @@ def delete_element_next_frame(element_name: str):
     """
     if element_name != "":
         ui_data.element_keys_to_delete.append(element_name)
-        logging.debug(f"Added {element_name} to delete list.")
+        logger.debug("Added %s to delete list.", element_name)
 
 
 ######################## NAVIGATION - MOVING AROUND SCREENS ###############################
@@ -98,52 +294,103 @@ def swap_to_antechamber_screen():
     """
     Show the antechamber screen
     """
-    delete_element_next_frame(ui_data.focused_element_name)
-
     from scripts.ui_elements.antechamber import AntechamberScreen
-    screen = AntechamberScreen(ui_data.gui, Rect((0, 0), (BASE_WINDOW_WIDTH, BASE_WINDOW_HEIGHT)))
-    ui_data.new_elements["antechamber"] = screen
-
-    set_focused_element("antechamber")
+    _swap_to_screen("antechamber", AntechamberScreen)
 
 
 def swap_to_council_screen():
     """
     Show the Council screen
     """
-    delete_element_next_frame(ui_data.focused_element_name)
-
     from scripts.ui_elements.council import CouncilScreen
-    screen = CouncilScreen(ui_data.gui, Rect((0, 0), (BASE_WINDOW_WIDTH, BASE_WINDOW_HEIGHT)))
-    ui_data.new_elements["council"] = screen
-
-    set_focused_element("council")
-    logging.debug("Now showing Council Screen.")
+    _swap_to_screen("council", CouncilScreen)
+    logger.debug("Now showing Council Screen.")
 
 
 def swap_to_selection_screen():
     """
     Show the selection screen
     """
-    delete_element_next_frame(ui_data.focused_element_name)
-
     from scripts.ui_elements.selection import SelectionScreen
-    screen = SelectionScreen(ui_data.gui, Rect((0, 0), (BASE_WINDOW_WIDTH, BASE_WINDOW_HEIGHT)))
-    ui_data.new_elements["selection"] = screen
-
-    set_focused_element("selection")
-    logging.debug("Now showing Selection Screen.")
+    _swap_to_screen("selection", SelectionScreen)
+    logger.debug("Now showing Selection Screen.")
 
 
 def swap_to_main_menu_screen():
     """
     Show the main menu screen
     """
+    from scripts.ui_elements.main_menu import MainMenuScreen
+    _swap_to_screen("main_menu", MainMenuScreen)
+    logger.debug("Now showing Main Menu Screen.")
+
+
+def _swap_to_screen(name: str, screen_type: Type[Screen]):
+    """
+    Replace the focused screen with the named screen. Reuses the cached screen if what it shows is unchanged,
+    otherwise builds a new one.
+    """
     delete_element_next_frame(ui_data.focused_element_name)
 
-    screen = MainMenuScreen(ui_data.gui, Rect((0, 0), (BASE_WINDOW_WIDTH, BASE_WINDOW_HEIGHT)))
-    ui_data.new_elements["main_menu"] = screen
+    screen = _get_cached_screen(name, screen_type)
+    if screen is None:
+        screen = screen_type(ui_data.gui, Rect((0, 0), (BASE_WINDOW_WIDTH, BASE_WINDOW_HEIGHT)))
+        _cache_screen(name, screen)
+    ui_data.new_elements[name] = screen
+
+    set_focused_element(name)
+
+
+######################## SCREEN CACHE ###############################
+
+def _get_cached_screen(name: str, screen_type: Type[Screen]) -> Optional[Screen]:
+    """
+    Get the named screen from the cache, if it is still up to date. An out of date screen is removed from the cache.
+    """
+    screen = ui_data.screen_cache.get(name)
+    if screen is None:
+        return None
+
+    if type(screen) is screen_type and screen.revision == screen_type.get_world_revision():
+        ui_data.screen_cache.move_to_end(name)
+        logger.debug("Reusing cached %s screen.", name)
+        return screen
+
+    # out of date. If it is still showing it is killed when swapped away from, as it is no longer cached.
+    del ui_data.screen_cache[name]
+    if not _is_screen_in_use(screen):
+        screen.kill()
+
+    return None
 
-    set_focused_element("main_menu")
-    logging.debug("Now showing Main Menu Screen.")
 
+def _cache_screen(name: str, screen: Screen):
+    """
+    Add the screen to the cache, removing the least recently used screens if the cache is using too much memory.
+    """
+    if not USE_SCREEN_CACHE or not screen.is_cacheable:
+        return
+
+    cache = ui_data.screen_cache
+    cache[name] = screen
+
+    # always keep the newest
+    while len(cache) > 1 and sum(cached.get_memory_use() for cached in cache.values()) > SCREEN_CACHE_MAX_BYTES:
+        evicted_name, evicted = cache.popitem(last=False)
+        if not _is_screen_in_use(evicted):
+            evicted.kill()
+        logger.debug("Evicted %s screen from the cache.", evicted_name)
+
+
+def _is_cached(name: str, screen: Screen) -> bool:
+    """
+    Check if the screen is the one held in the cache under name.
+    """
+    return ui_data.screen_cache.get(name) is screen
+
+
+def _is_screen_in_use(screen: Screen) -> bool:
+    """
+    Check if the screen is showing or about to be shown.
+    """
+    return any(element is screen for element in chain(ui_data.elements.values(), ui_data.new_elements.values()))
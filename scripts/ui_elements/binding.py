@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Type
+
+from scripts import ui, world
+
+if TYPE_CHECKING:
+    from typing import Union, Optional, Any, Tuple, Dict, List, Callable, Collection
+    from pygame_gui.core import UIElement
+    from snecs import Component
+    from snecs.typedefs import EntityID
+
+
+class Binding:
+    """
+    Keep an element's text in step with an entity's components. When any of the components are marked dirty the
+    text is fetched again and set on the element, at most once a frame. If fields are given, only changes to those
+    fields count.
+    """
+    def __init__(self, element: UIElement, entity: EntityID, components: Tuple[Type[Component], ...],
+            get_text: Callable[[], str], fields: Collection[str] = ()):
+        self.element: UIElement = element
+        self.entity: EntityID = entity
+        self.components: Tuple[Type[Component], ...] = components
+        self.get_text: Callable[[], str] = get_text
+        self.fields: Collection[str] = fields
+        self.text: str = get_text()
+        self.is_active: bool = True
+
+        for component in components:
+            world.add_observer(component, self.notify)
+
+    def notify(self, entity: EntityID, fields: Collection[str]):
+        """
+        Called by the world when a watched component is marked dirty. Queues a refresh if the change is relevant.
+        """
+        if entity != self.entity:
+            return
+
+        # no fields means anything may have changed
+        if self.fields and fields and not any(field in self.fields for field in fields):
+            return
+
+        ui.queue_binding_refresh(self)
+
+    def refresh(self):
+        """
+        Set the element's text, if it has changed.
+        """
+        if not self.is_active:
+            return
+
+        text = self.get_text()
+        if text != self.text:
+            self.text = text
+            self.element.set_text(text)
+
+    def unbind(self):
+        """
+        Stop watching the components. The element is left as it is.
+        """
+        for component in self.components:
+            world.remove_observer(component, self.notify)
+        self.is_active = False
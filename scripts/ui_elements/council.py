@@ -16,16 +16,39 @@ if TYPE_CHECKING:
 
 
 class CouncilScreen(Screen):
+    is_date_shown = True
+
     def __init__(self, manager: UIManager, rect: Rect):
         super().__init__(manager, rect)
         self.options["hire"] = ("* View the Rolls - Hire Staff", None)
 
+        # create the screen
+        self.create_header("Your Council")
+        self.create_info_section(self.info_x, self.post_header_y, self.info_width, self.half_max_section_height,
+                                 self.get_info_text())
+        self.create_option_section(self.button_x, self.option_text_x,
+                                   self.post_header_y + self.half_max_section_height,
+                                   self.button_width, self.button_height, self.option_text_width,
+                                   self.half_max_section_height)
+        self.create_choice_field(allowed_str=False)
+        self.create_hourglass_display()
+
+        # keep the info up to date as the kingdom changes
+        self.bind("info", world.get_player_kingdom(), (Details, Population, Demesne, CastleStaff), self.get_info_text)
+
+    @staticmethod
+    def get_info_text() -> str:
+        """
+        Get the text describing the player's kingdom
+        """
         # prep to build info text
         info_text = ""
         player_kingdom = world.get_player_kingdom()
 
+        details, population, lands, staff = world.get_component_view(player_kingdom, (Details, Population, Demesne,
+                                                                                      CastleStaff))
+
         # current date and kingdom name
-        details = world.get_entitys_component(player_kingdom, Details)
         date = world.get_current_date()
         info_text += f"It is the {str(date[0])} day, in the {str(date[1])} season, of the {str(date[2])} year in " \
                      f"{details.kingdom_name}..." + LINE_BREAK
@@ -34,7 +57,6 @@ class CouncilScreen(Screen):
         info_text += LINE_BREAK + LINE_BREAK
         info_text += "-- Subjects --" + LINE_BREAK
 
-        population = world.get_entitys_component(player_kingdom, Population)
         pop_text = ""
         for demo in population:
             pop_text += demo.name + ": " + str(demo.amount) + " (" + str(demo.birth_rate_in_year) + " per year), "
@@ -43,7 +65,6 @@ class CouncilScreen(Screen):
         # new section: land
         info_text += LINE_BREAK + LINE_BREAK
         info_text += "-- Demesne --" + LINE_BREAK
-        lands = world.get_entitys_component(player_kingdom, Demesne)
         land_text = ""
         for land in lands:
             land_text += land.name + ": " + land.size + ", "
@@ -54,21 +75,10 @@ class CouncilScreen(Screen):
         info_text += "-- Staff --" + LINE_BREAK
 
         # add staff info
-        staff = world.get_entitys_component(player_kingdom, CastleStaff)
         for member in staff:
             info_text += member.name + ", your " + member.role + "."
 
-        # create the screen
-        self.create_header("Your Council")
-        self.create_info_section(self.info_x, self.post_header_y, self.info_width, self.half_max_section_height,
-                                 info_text)
-        self.create_option_section(self.button_x, self.option_text_x,
-                                   self.post_header_y + self.half_max_section_height,
-                                   self.button_width, self.button_height, self.option_text_width,
-                                   self.half_max_section_height)
-        self.create_choice_field(allowed_str=False)
-        self.create_hourglass_display()
-
+        return info_text
 
     def handle_event(self, event: pygame.event.Event):
         # get the id
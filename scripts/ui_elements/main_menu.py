@@ -1,14 +1,13 @@
 from __future__ import annotations
 
 import logging
-import os
 from typing import TYPE_CHECKING, Type
 
 import pygame_gui
 
 from scripts import state, ui
 from scripts.components import CastleStaff, Hourglass, IsPlayerControlled
-from scripts.constants import EXIT, SAVE_PATH
+from scripts.constants import EXIT, MAIN_MENU, PLAYING
 from scripts.ui_elements.screen import Screen
 
 if TYPE_CHECKING:
@@ -24,6 +23,16 @@ class MainMenuScreen(Screen):
 
         self.setup_main_menu()
 
+    def show(self):
+        """
+        Show the screen again, always starting from the main menu rather than wherever it was left.
+        """
+        if self.showing != "main_menu":
+            self.setup_main_menu()
+
+        super().show()
+        state.set_new(MAIN_MENU)
+
     def handle_event(self, event: pygame.event.Event):
         """
         Handle events
@@ -80,10 +89,16 @@ class MainMenuScreen(Screen):
             "cancel": ("Go Back", self.setup_main_menu),
         }
 
-        # get all save files as options
-        for filename in os.listdir(os.getcwd() + "/" + SAVE_PATH):
-            filename = filename.replace(".json", "")
-            self.options[filename] = (filename, None)
+        # get all saves as options, newest first within each kingdom
+        catalog = state.get_save_catalog()
+        filenames = sorted(catalog, key=lambda _filename: (catalog[_filename]["kingdom_name"],
+                                                           -catalog[_filename]["days_passed"], _filename))
+        for filename in filenames:
+            header = catalog[filename]
+            day, season, year = header["date"]
+            text = f"{header['kingdom_name']} - day {day}, season {season}, year {year} - " \
+                   f"{header['population']} subjects ({filename})"
+            self.options[filename] = (text, None)
 
         # create the screen
         self.create_option_section(self.button_x, self.option_text_x,
@@ -102,17 +117,26 @@ class MainMenuScreen(Screen):
             CastleStaff([]),
             Hourglass()
         ]
-        from scripts import world
+        from scripts import rng, world
+        world.set_seed(rng.create_seed())
         player_kingdom = world.create_entity(components)
 
+        state.set_new(PLAYING)
         ui.swap_to_selection_screen()
 
     def init_load_game(self, filename: str):
         """
         Load the game data for the selected filename, and swap to antechamber screen
         """
-        state.load_game(filename)
-
+        try:
+            state.load_game(filename)
+        except FileNotFoundError:
+            # deleted since the list was shown, so show the list again without it
+            logging.warning(f"Save {filename} no longer exists. Couldn't load it.")
+            self.setup_load_game()
+            return
+
+        state.set_new(PLAYING)
         ui.swap_to_antechamber_screen()
 
     def exit_game(self):
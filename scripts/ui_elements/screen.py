@@ -11,11 +11,14 @@ from pygame.rect import Rect
 from scripts import ui, world
 from scripts.components import Hourglass
 from scripts.constants import LINE_BREAK
+from scripts.ui_elements.binding import Binding
 
 if TYPE_CHECKING:
-    from typing import Union, Optional, Any, Tuple, Dict, List, Callable
+    from typing import Union, Optional, Any, Tuple, Dict, List, Callable, Collection
     from pygame_gui import UIManager
     from pygame_gui.core import UIElement
+    from snecs import Component
+    from snecs.typedefs import EntityID
 
 
 class Screen(ABC):
@@ -49,14 +52,23 @@ class Screen(ABC):
     hourglass_width = 300
     hourglass_height = choice_height
 
+    # what the screen shows from the world, other than through bindings. A cached screen is rebuilt once any of these
+    # have changed.
+    shown_components: Tuple[Type[Component], ...] = ()
+    is_date_shown: bool = False
+    is_cacheable: bool = True
+
     def __init__(self, manager: UIManager, rect: Rect):
         self.manager: UIManager = manager
         self.rect: Rect = rect
         self.elements: Dict[str, UIElement] = {}
+        self.bindings: List[Binding] = []
+        self.option_keys: List[str] = []  # option keys in the order they are numbered on screen
         self.options: Dict[str, Tuple[str, Callable]] = {
             "anteroom": ("Anteroom - Return", ui.swap_to_antechamber_screen)
         }
         self.showing = ""  # flag is set in setup
+        self.revision: Tuple[int, ...] = self.get_world_revision()
 
         # default values that need rect before they can be set
         self.header_width = rect.width
@@ -77,22 +89,59 @@ class Screen(ABC):
 
     def kill(self):
         """
-        Delete all elements from self.elements and clear self.options.
+        Delete all elements from self.elements, their bindings, and clear self.options.
         """
+        for binding in self.bindings:
+            binding.unbind()
+        self.bindings = []
+
         elements = self.elements
         for name, element in elements.items():
+            ui.remove_event_route(element)
             element.kill()
         self.elements = {}
         self.options = {}
+        self.option_keys = []
+
+    def show(self):
+        """
+        Show all elements, ready to be used again. Clears any previous choice.
+        """
+        for element in self.elements.values():
+            element.show()
+
+        if "choice" in self.elements:
+            self.elements["choice"].set_text("")
+
+    def hide(self):
+        """
+        Hide all elements, keeping them to be shown again later.
+        """
+        for element in self.elements.values():
+            element.hide()
 
     ############################ CREATE ##############################
 
+    def add_element(self, name: str, element: UIElement):
+        """
+        Add an element to the screen, routing its events to this screen.
+        """
+        self.elements[name] = element
+        ui.add_event_route(element, self)
+
+    def bind(self, element_name: str, entity: EntityID, components: Tuple[Type[Component], ...],
+            get_text: Callable[[], str], fields: Collection[str] = ()):
+        """
+        Keep the named element's text up to date with the entity's components. See Binding.
+        """
+        self.bindings.append(Binding(self.elements[element_name], entity, components, get_text, fields))
+
     def create_info_section(self, x: int, y: int, width: int, height: int, text: str):
         """
         Create an information section on the screen. Called "info".
         """
         info_text = UITextBox(text, Rect((x, y), (width, height)), self.manager, False, 1)
-        self.elements["info"] = info_text
+        self.add_element("info", info_text)
 
     def create_option_section(self, button_x: int, text_x: int, y: int, button_width: int, button_height: int,
                                 text_width: int, text_height: int):
@@ -110,21 +159,22 @@ class Screen(ABC):
         # create panel to hold it all
         panel = UIPanel(Rect((button_x, y), (button_width + text_width, text_height)), 0, self.manager,
                         object_id="options")
-        self.elements["panel"] = panel
+        self.add_element("panel", panel)
 
         # loop options and extract text and id
+        self.option_keys = list(self.options)
         for _id, (text, _method) in self.options.items():
             options_text += text + LINE_BREAK + LINE_BREAK
             option_button = UIButton(Rect((button_x, y + offset_y), (button_width, button_height)),
                                      str(count), self.manager, object_id=_id, parent_element=panel)
             count += 1
             offset_y += button_height
-            self.elements[_id] = option_button
+            self.add_element(_id, option_button)
 
         # add text to textbox
         options_text = UITextBox(options_text, Rect((text_x, y), (text_width, text_height)), self.manager, False, 1,
                                  parent_element=panel)
-        self.elements["text"] = options_text
+        self.add_element("text", options_text)
 
     def create_header(self, text: str):
         """
@@ -132,7 +182,7 @@ class Screen(ABC):
         """
         header = UILabel(Rect((self.header_x, self.header_y), (self.header_width, self.header_height)), text,
                          self.manager)
-        self.elements["header"] = header
+        self.add_element("header", header)
 
     def create_choice_field(self, allowed_str: bool = True, allowed_num: bool = True):
         """
@@ -149,16 +199,14 @@ class Screen(ABC):
         elif not allowed_str and allowed_num:
             choice.set_allowed_characters("numbers")
 
-        self.elements["choice"] = choice
+        self.add_element("choice", choice)
 
     def create_hourglass_display(self):
         """
         Create the display of how much time is left in the day
         """
-        # get the text
         player_kingdom = world.get_player_kingdom()
-        hourglass = world.get_entitys_component(player_kingdom, Hourglass)
-        text = f"{str(hourglass.minutes_available)} minutes before sunset"
+        text = self.get_hourglass_text()
 
         # create the label
         rect = Rect((-self.hourglass_width - self.section_start_x, self.choice_y), (self.hourglass_width,
@@ -171,7 +219,39 @@ class Screen(ABC):
                                         "bottom": "bottom"
                                     })
 
-        self.elements["hourglass"] = hourglass_display
+        self.add_element("hourglass", hourglass_display)
+        self.bind("hourglass", player_kingdom, (Hourglass, ), self.get_hourglass_text, ("minutes_available", ))
+
+    ############################ GET ##############################
+
+    @classmethod
+    def get_world_revision(cls) -> Tuple[int, ...]:
+        """
+        Get a marker of the state of everything the screen shows from the world. See world.get_revision.
+        """
+        revision = world.get_revision(cls.shown_components)
+        if cls.is_date_shown:
+            revision += (world.get_days_passed(), )
+        return revision
+
+    @staticmethod
+    def get_hourglass_text() -> str:
+        """
+        Get the text showing how much time is left in the day
+        """
+        hourglass = world.get_entitys_component(world.get_player_kingdom(), Hourglass)
+        return f"{str(hourglass.minutes_available)} minutes before sunset"
+
+    def get_memory_use(self) -> int:
+        """
+        Get an estimate of the memory, in bytes, held by the images of the screen's elements.
+        """
+        memory_use = 0
+        for element in self.elements.values():
+            image = element.image
+            if image is not None:
+                memory_use += image.get_bytesize() * image.get_width() * image.get_height()
+        return memory_use
 
     ############################ CHECKS ##############################
 
@@ -186,7 +266,7 @@ class Screen(ABC):
         elif event.user_type == pygame_gui.UI_TEXT_ENTRY_FINISHED:
             if event.text.isnumeric():
                 try:
-                    object_id = list(self.options)[int(event.text) - 1]  # -1 to offset from options starting at 1
+                    object_id = self.option_keys[int(event.text) - 1]  # -1 to offset from options starting at 1
                 except KeyError:
                     logging.warning(f"Key not found in options when getting object id. Dodgy typing? ({event.text})")
                 except IndexError:
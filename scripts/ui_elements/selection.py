@@ -19,6 +19,8 @@ class SelectionScreen(Screen):
     """
     Handle selection of race and location
     """
+    is_cacheable = False  # holds choices part way through creating a kingdom
+
     def __init__(self, manager: UIManager, rect: Rect):
         super().__init__(manager, rect)
 
@@ -2,15 +2,18 @@ from __future__ import annotations
 
 import snecs
 from typing import TYPE_CHECKING, Type, TypeVar
-from snecs import Component, Query, new_entity
+from snecs import Component, Query, World, new_entity
+from snecs.ecs import SERIALIZED_COMPONENTS_KEY, SERIALIZED_ENTITIES_KEY
 from snecs.typedefs import EntityID
 from scripts import debug
-from scripts.components import Details, IsPlayerControlled
+from scripts.catalog import load_catalog
+from scripts.components import Demesne, Details, IsPlayerControlled
 from scripts.constants import DAYS_IN_SEASON, DAYS_IN_YEAR, SEASONS_IN_YEAR
 from scripts.stores.world_data import world_data
 
 if TYPE_CHECKING:
-    from typing import Union, Optional, Any, Tuple, Dict, List
+    from typing import Union, Optional, Any, Tuple, Dict, List, Set, Callable, Collection, Hashable, Iterable, Mapping
+    from scripts.catalog import Catalog
 
 
 _C = TypeVar("_C", bound=Component)
@@ -19,8 +22,16 @@ get_components = Query
 has_component = snecs.has_component
 serialise = snecs.serialize_world
 deserialise = snecs.deserialize_world
-process_pending_deletions = snecs.process_pending_deletions
-move_world = snecs.ecs.move_world
+
+# marker and singleton components whose entities are indexed, so finding them doesnt need a query
+INDEXED_FLAG_COMPONENTS = (IsPlayerControlled, )
+
+# indexes of entities by values held in their components. Name: (component, function getting the keys for an entity's
+# component). Add more with declare_index.
+SECONDARY_INDEXES: Dict[str, Tuple[Type[Component], Callable[[Any], Collection[Hashable]]]] = {
+    "kingdom_name": (Details, lambda details: (details.kingdom_name, )),
+    "terrain": (Demesne, lambda demesne: {land.terrain for land in demesne}),
+}
 
 
 ################################ CREATE - INIT OBJECT - RETURN NEW OBJECT ###############################
@@ -37,6 +48,11 @@ def create_entity(components: List[Component] = None) -> EntityID:
     # create the entity
     entity = new_entity(_components)
 
+    # a new entity is entirely unsaved
+    for component in _components:
+        mark_dirty(entity, component.__class__)
+        _index_component(entity, component.__class__)
+
     return entity
 
 
@@ -46,69 +62,139 @@ def get_player_kingdom() -> EntityID:
     """
     Get the player.
     """
-    for entity, (flag,) in get_components([IsPlayerControlled]):
-        return entity
+    return get_flagged_entity(IsPlayerControlled)
+
+
+def get_flagged_entity(component: Type[Component]) -> EntityID:
+    """
+    Get the entity with a marker or singleton component. Component must be in INDEXED_FLAG_COMPONENTS. If more than
+    one entity has the component any one of them may be returned.
+    """
+    entities = world_data.flag_index.get(component)
+    if entities:
+        return next(iter(entities))
     raise ValueError
 
 
+def get_flagged_entities(component: Type[Component]) -> Set[EntityID]:
+    """
+    Get all entities with a marker component. Component must be in INDEXED_FLAG_COMPONENTS. Do not change the set
+    returned.
+    """
+    return world_data.flag_index.get(component, set())
+
+
 def get_entitys_component(entity: EntityID, component: Type[_C]) -> _C:
     """
     Get an entity's component. Log if component not found.
     """
-    if has_component(entity, component):
+    try:
         return snecs.entity_component(entity, component)
-    else:
+    except KeyError:
         debug.log_component_not_found(entity, component)
         raise Exception
 
 
+def get_component_view(entity: EntityID, components: Tuple[Type[Component], ...]) -> Tuple[Any, ...]:
+    """
+    Get several of an entity's components in one go, in the order given. Log if any component not found.
+    """
+    try:
+        entitys_components = get_entitys_components(entity)
+        return tuple([entitys_components[component] for component in components])
+    except KeyError:
+        for component in components:
+            if not has_component(entity, component):
+                debug.log_component_not_found(entity, component)
+        raise Exception
+
+
 def get_name(entity: EntityID) -> str:
     """
     Get an entity's Identity component's name.
     """
-    identity = get_entitys_component(entity, Details)
-    if identity:
-        name = identity.kingdom_name
-    else:
+    try:
+        name = snecs.entity_component(entity, Details).kingdom_name
+    except KeyError:
         name = "not found"
 
     return name
 
 
-def get_all_race_data() -> Dict[str, Dict[str, Union[int, str]]]:
+def get_entities_by_index(index_name: str, key: Hashable) -> Set[EntityID]:
+    """
+    Get the entities whose component has the key in the named secondary index, e.g. ("terrain", "woods"). Do not
+    change the set returned.
+    """
+    if world_data.are_secondary_indexes_stale:
+        _rebuild_secondary_indexes()
+
+    return world_data.secondary_indexes[index_name].get(key, set())
+
+
+def get_catalog(name: str) -> Catalog:
+    """
+    Get the base data from the named data file, e.g. "races", loading it on first use
+    """
+    catalog = world_data.catalogs.get(name)
+    if catalog is None:
+        catalog = world_data.catalogs[name] = load_catalog(name)
+    return catalog
+
+
+def get_all_race_data() -> Mapping[str, Dict[str, Union[int, str]]]:
     """
     Get the base data for all races
     """
-    return world_data.races
+    return get_catalog("races")
 
 
 def get_race_data(race_name: str) -> Dict[str, Union[int, str]]:
     """
     Get the base data for a race
     """
-    return world_data.races[race_name]
+    return get_catalog("races")[race_name]
 
 
-def get_all_land_data() -> Dict[str, Dict[str, str]]:
+def get_all_land_data() -> Mapping[str, Dict[str, str]]:
     """
     Get the base data for all lands
     """
-    return world_data.lands
+    return get_catalog("lands")
 
 
 def get_land_data(land_name: str) -> Dict[str, str]:
     """
     Get the base data for a land
     """
-    return world_data.lands[land_name]
+    return get_catalog("lands")[land_name]
+
+
+def get_all_staff_data() -> Mapping[str, Dict[str, Union[int, str]]]:
+    """
+    Get the base data for all staff archetypes
+    """
+    return get_catalog("staff")
+
+
+def get_staff_data(archetype_name: str) -> Dict[str, Union[int, str]]:
+    """
+    Get the base data for a staff archetype
+    """
+    return get_catalog("staff")[archetype_name]
 
 
 def get_current_date() -> Tuple[int, int, int]:
     """
     Get the current day, season, year
     """
-    total_days = world_data.days_passed
+    return get_date(world_data.days_passed)
 
+
+def get_date(total_days: int) -> Tuple[int, int, int]:
+    """
+    Get the day, season, year after a given amount of days have passed
+    """
     current_year, days_passed_in_year = divmod(total_days, DAYS_IN_YEAR)
     current_season, current_day = divmod(days_passed_in_year, DAYS_IN_SEASON)
 
@@ -119,6 +205,58 @@ def get_current_date() -> Tuple[int, int, int]:
     return current_day, current_season, current_year
 
 
+def serialise_changes() -> Dict[str, Any]:
+    """
+    Serialise only the components marked dirty, and the entities deleted, since changes were last cleared.
+    """
+    entities: Dict[str, Dict[str, Any]] = {}
+    for entity, component_types in world_data.dirty_components.items():
+        if entity in world_data.deleted_entities:
+            continue
+
+        entitys_components = get_entitys_components(entity)
+        entities[str(entity)] = {component_type.__name__: entitys_components[component_type].serialize()
+                                 for component_type in component_types if component_type in entitys_components}
+
+    changes = {
+        "days_passed": world_data.days_passed,
+        "entities": entities,
+        "deleted": [str(entity) for entity in world_data.deleted_entities]
+    }
+
+    return changes
+
+
+def get_revision(components: Iterable[Type[Component]]) -> Tuple[int, ...]:
+    """
+    Get a marker of the state of the given component types. If the marker differs between two calls then at least one
+    of those components has been changed, added or deleted in between.
+    """
+    component_revisions = world_data.component_revisions
+    return (world_data.revision,) + tuple(component_revisions.get(component, 0) for component in components)
+
+
+def get_days_passed() -> int:
+    """
+    Get the amount of days passed
+    """
+    return world_data.days_passed
+
+
+def get_seed() -> int:
+    """
+    Get the seed that all of the world's random draws derive from.
+    """
+    return world_data.seed
+
+
+def get_days_passed_on_date(day: int, season: int, year: int) -> int:
+    """
+    Get the amount of days passed on a given day, season, year. The inverse of get_current_date.
+    """
+    return ((year - 1) * DAYS_IN_YEAR) + ((season - 1) * DAYS_IN_SEASON) + day
+
+
 ################################ SET - AMEND AN EXISTING SOMETHING ###############################
 
 def set_days_passed(days_passed: int):
@@ -128,6 +266,31 @@ def set_days_passed(days_passed: int):
     world_data.days_passed = days_passed
 
 
+def set_seed(seed: int):
+    """
+    Set the seed that all of the world's random draws derive from.
+    """
+    world_data.seed = seed
+
+
+def merge_changes(serialised_world: Dict[str, Any], changes: Dict[str, Any]):
+    """
+    Apply changes, as given by serialise_changes, to a serialised world, as given by serialise.
+    """
+    component_names: List[str] = serialised_world[SERIALIZED_COMPONENTS_KEY]
+    serialised_entities: Dict[str, Dict[str, Any]] = serialised_world[SERIALIZED_ENTITIES_KEY]
+
+    for entity, components in changes["entities"].items():
+        serialised_components = serialised_entities.setdefault(entity, {})
+        for component_name, serialised_component in components.items():
+            if component_name not in component_names:
+                component_names.append(component_name)
+            serialised_components[str(component_names.index(component_name))] = serialised_component
+
+    for entity in changes["deleted"]:
+        serialised_entities.pop(entity, None)
+
+
 ################################ ACTIONS - CHANGE STATE - RETURN NOTHING ###############################
 
 def add_component(entity: EntityID, component: Component):
@@ -135,6 +298,105 @@ def add_component(entity: EntityID, component: Component):
     Add a component to the entity
     """
     snecs.add_component(entity, component)
+    mark_dirty(entity, component.__class__)
+    _index_component(entity, component.__class__)
+
+
+def delete_entity(entity: EntityID):
+    """
+    Delete the entity at the end of the frame
+    """
+    snecs.schedule_for_deletion(entity)
+    world_data.deleted_entities.add(entity)
+    world_data.entities_to_delete.add(entity)
+
+
+def process_pending_deletions():
+    """
+    Delete all entities scheduled for deletion
+    """
+    if world_data.entities_to_delete:
+        for entity in world_data.entities_to_delete:
+            for entities in world_data.flag_index.values():
+                entities.discard(entity)
+            for index_name in SECONDARY_INDEXES:
+                _unindex_secondary(index_name, entity)
+        world_data.entities_to_delete = set()
+        world_data.revision += 1
+
+    snecs.process_pending_deletions()
+
+
+def move_world(new_world: World):
+    """
+    Replace the current world with new_world, leaving new_world empty.
+    """
+    snecs.ecs.move_world(new_world)
+    world_data.entities_to_delete = set()
+    world_data.revision += 1
+    rebuild_indexes()
+
+
+def rebuild_indexes():
+    """
+    Rebuild the indexes of the world's components from scratch.
+    """
+    world_data.flag_index = {}
+    for component in INDEXED_FLAG_COMPONENTS:
+        world_data.flag_index[component] = {entity for entity, (flag, ) in get_components([component])}
+
+    # secondary indexes can need lazily loaded components, so wait until they're used
+    world_data.are_secondary_indexes_stale = True
+
+
+def declare_index(index_name: str, component: Type[Component], get_keys: Callable[[Any], Collection[Hashable]]):
+    """
+    Add a secondary index of entities, by the keys get_keys returns for their instance of component.
+    """
+    SECONDARY_INDEXES[index_name] = (component, get_keys)
+    world_data.are_secondary_indexes_stale = True
+
+
+def mark_dirty(entity: EntityID, component_type: Type[Component], fields: Collection[str] = ()):
+    """
+    Record that an entity's component has changed and needs to be saved, and tell any observers. Fields names the
+    attributes changed, if known. Empty means any may have.
+    """
+    world_data.dirty_components.setdefault(entity, set()).add(component_type)
+    world_data.component_revisions[component_type] = world_data.component_revisions.get(component_type, 0) + 1
+
+    for observer in world_data.observers.get(component_type, ()):
+        observer(entity, fields)
+
+    # the component's values may have changed, so reindex it
+    if not world_data.are_secondary_indexes_stale:
+        for index_name, (component, get_keys) in SECONDARY_INDEXES.items():
+            if component is component_type:
+                _index_secondary(index_name, entity, get_keys(snecs.entity_component(entity, component)))
+
+
+def add_observer(component_type: Type[Component], observer: Callable[[EntityID, Collection[str]], None]):
+    """
+    Call observer with the entity and changed fields whenever a component of component_type is marked dirty.
+    """
+    world_data.observers.setdefault(component_type, []).append(observer)
+
+
+def remove_observer(component_type: Type[Component], observer: Callable[[EntityID, Collection[str]], None]):
+    """
+    Stop calling observer when a component of component_type is marked dirty.
+    """
+    observers = world_data.observers.get(component_type, [])
+    if observer in observers:
+        observers.remove(observer)
+
+
+def clear_changes():
+    """
+    Forget all changes recorded since the last save
+    """
+    world_data.dirty_components = {}
+    world_data.deleted_entities = set()
 
 
 def pass_days(days: int = 1):
@@ -142,3 +404,51 @@ def pass_days(days: int = 1):
     Move time forwards by days
     """
     world_data.days_passed += days
+
+
+def _index_component(entity: EntityID, component: Type[Component]):
+    """
+    Add an entity to the indexes for a component it has been given.
+    """
+    if component in INDEXED_FLAG_COMPONENTS:
+        world_data.flag_index.setdefault(component, set()).add(entity)
+
+
+def _index_secondary(index_name: str, entity: EntityID, keys: Collection[Hashable]):
+    """
+    Set the keys an entity is found by in a secondary index, replacing any it had before.
+    """
+    _unindex_secondary(index_name, entity)
+
+    index = world_data.secondary_indexes[index_name]
+    for key in keys:
+        index.setdefault(key, set()).add(entity)
+    world_data.secondary_index_keys[index_name][entity] = keys
+
+
+def _unindex_secondary(index_name: str, entity: EntityID):
+    """
+    Remove an entity from a secondary index.
+    """
+    if world_data.are_secondary_indexes_stale:
+        return
+
+    index = world_data.secondary_indexes[index_name]
+    for key in world_data.secondary_index_keys[index_name].pop(entity, ()):
+        entities = index[key]
+        entities.discard(entity)
+        if not entities:
+            del index[key]
+
+
+def _rebuild_secondary_indexes():
+    """
+    Rebuild every secondary index from scratch.
+    """
+    world_data.secondary_indexes = {index_name: {} for index_name in SECONDARY_INDEXES}
+    world_data.secondary_index_keys = {index_name: {} for index_name in SECONDARY_INDEXES}
+    world_data.are_secondary_indexes_stale = False
+
+    for index_name, (component, get_keys) in SECONDARY_INDEXES.items():
+        for entity, (instance, ) in get_components([component]):
+            _index_secondary(index_name, entity, get_keys(instance))